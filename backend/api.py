@@ -1,39 +1,181 @@
 # api.py
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import pandas as pd
-from sqlalchemy import create_engine, text
 import os
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
 from fastapi.middleware.cors import CORSMiddleware
-import chromadb
-from sentence_transformers import SentenceTransformer
-import numpy as np
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+import pyarrow as pa
+from backend.db import DuckDBExecutor, QueryExecutor
+from backend.cache import ResultCache, SemanticAnswerCache
+from backend.embeddings import BatchingEncoder
+from backend.resources import LazyResource, RemoteEmbeddingModel, load_sentence_transformer
+from backend.llm import LLMClient
+from backend.results import ResultStore, digest, page, profile_downsample, scalar_summary, spatial_bins
+from backend.retrieval import CYCLE_COLLECTION, FLOAT_COLLECTION, retrieve
+from backend.tracing import annotate, classify_error, configure_slow_query_log, stage, start_trace
+from backend.serialization import (
+    ARROW_MEDIA_TYPE,
+    FastJSONResponse,
+    columnar,
+    dumps,
+    to_arrow_ipc,
+    wants_arrow,
+)
+from backend.metadata import (
+    DB_CONTEXT_KEY,
+    DataVersionWatcher,
+    compute_db_context,
+    format_db_context,
+    read_metadata,
+)
 
 # --- 1. SETUP & CONFIGURATION ---
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "YOUR_POSTGRES_PASSWORD")
 
-# --- NEW: INITIALIZE VECTOR DB AND EMBEDDING MODEL ON STARTUP ---
-try:
+# Concurrency limits for the /ask pipeline. Embedding and SQL run on their own
+# bounded executors so slow requests can't starve the event loop or each other.
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "2"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "10"))
+DB_POOL_RECYCLE_SECONDS = int(os.getenv("DB_POOL_RECYCLE_SECONDS", "1800"))
+STATEMENT_TIMEOUT_MS = int(os.getenv("STATEMENT_TIMEOUT_MS", "15000"))
+MAX_RESULT_ROWS = int(os.getenv("MAX_RESULT_ROWS", "10000"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", "30"))
+
+# LLM client: one shared model, at most LLM_MAX_CONCURRENCY calls in flight,
+# transient errors retried LLM_MAX_RETRIES times with exponential backoff.
+# LLM_TRANSPORT optionally picks the Gemini transport ("rest", "grpc").
+# SCALAR_SUMMARY=template answers single-value results (an aliased aggregate such as
+# AVG(temperature) AS average_temperature) from a template instead of a summary LLM
+# call. The default, "llm", always calls the model.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "0.5"))
+LLM_TRANSPORT = os.getenv("LLM_TRANSPORT")
+SCALAR_SUMMARY = os.getenv("SCALAR_SUMMARY", "llm").lower()
+
+# Opt-in slow-query log: requests slower than SLOW_QUERY_SECONDS are appended to
+# SLOW_QUERY_LOG as JSON lines (trace ID, per-stage timings, SQL, row count, error class).
+SLOW_QUERY_LOG = os.getenv("SLOW_QUERY_LOG")
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_SECONDS", "5"))
+configure_slow_query_log(SLOW_QUERY_LOG, SLOW_QUERY_SECONDS)
+
+# Query backend for the generated SQL:
+#   postgres - the argo_data table loaded by load_to_sql.py (default)
+#   duckdb   - in-process DuckDB over DUCKDB_PATH (built by load_to_duckdb.py) if set,
+#              otherwise directly over PARQUET_PATH; no database server needed
+QUERY_BACKEND = os.getenv("QUERY_BACKEND", "postgres").lower()
+DUCKDB_PATH = os.getenv("DUCKDB_PATH")
+PARQUET_PATH = os.getenv("PARQUET_PATH", "argo_final_data.parquet")
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", "0")) or None
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT")
+
+# Answer cache: exact question match first, then nearest neighbour on the question embedding.
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+# Cached answers hold their first page and views, so the cache is also bounded by their total size
+ANSWER_CACHE_MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+DATA_VERSION_CHECK_SECONDS = float(os.getenv("DATA_VERSION_CHECK_SECONDS", "30"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Rows per `rows` event on the streaming endpoint
+STREAM_ROW_CHUNK = int(os.getenv("STREAM_ROW_CHUNK", "500"))
+
+# Large results stay server-side: /ask returns the first page, a cursor for
+# GET /results/{id}, and bounded map/profile views. The summary LLM sees a digest
+# (stats + a sample) once a result has more than SUMMARY_FULL_ROWS rows.
+RESULT_PAGE_SIZE = int(os.getenv("RESULT_PAGE_SIZE", "1000"))
+RESULT_STORE_MAX_BYTES = int(os.getenv("RESULT_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+RESULT_STORE_TTL_SECONDS = float(os.getenv("RESULT_STORE_TTL_SECONDS", "1800"))
+SUMMARY_FULL_ROWS = int(os.getenv("SUMMARY_FULL_ROWS", "50"))
+SUMMARY_SAMPLE_ROWS = int(os.getenv("SUMMARY_SAMPLE_ROWS", "20"))
+MAP_MAX_POINTS = int(os.getenv("MAP_MAX_POINTS", "2000"))
+PROFILE_MAX_POINTS = int(os.getenv("PROFILE_MAX_POINTS", "500"))
+
+# Startup mode for the heavy resources (embedding model, Chroma collection, DB context):
+#   warm    - start serving immediately and load everything in a background warm-up task (default)
+#   lazy    - load each resource the first time a request needs it
+#   preload - load the embedding model at import time, e.g. for `gunicorn --preload` so forked workers
+#             share it; each worker then opens its own DB and Chroma clients before serving
+STARTUP_MODE = os.getenv("STARTUP_MODE", "warm")
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+# If set, embeddings come from backend/embedding_service.py instead of an in-process model.
+EMBEDDING_SERVICE_URL = os.getenv("EMBEDDING_SERVICE_URL")
+# "onnx" runs MiniLM on ONNX Runtime; EMBEDDING_ONNX_FILE can pick a quantized export
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")
+# Question encodes arriving within this window are run as one batch
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_BATCH = int(os.getenv("EMBEDDING_MAX_BATCH", "32"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+# Documents retrieved per collection. HNSW search_ef is index tuning: set it with
+# `populate_vectordb.py --hnsw-search-ef`, not from the API.
+RETRIEVAL_N_RESULTS = int(os.getenv("RETRIEVAL_N_RESULTS", "3"))
+
+embedding_executor = ThreadPoolExecutor(max_workers=EMBEDDING_WORKERS, thread_name_prefix="embed")
+db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE + DB_MAX_OVERFLOW, thread_name_prefix="sql")
+
+# --- NEW: VECTOR DB AND EMBEDDING MODEL (loaded lazily or by the warm-up task) ---
+def load_embedding_model():
+    if EMBEDDING_SERVICE_URL:
+        return RemoteEmbeddingModel(EMBEDDING_SERVICE_URL)
+    return load_sentence_transformer(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE)
+
+def load_collections():
+    """Opens the float collection (required) and the per-cycle collection (if it has been built)."""
+    import chromadb
     chroma_client = chromadb.PersistentClient(path="chroma_db")
-    collection = chroma_client.get_collection(name="argo_float_summaries")
-    embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-    print("✅ ChromaDB and sentence-transformer model loaded successfully.")
-except Exception as e:
-    print(f"❌ ERROR: Could not load ChromaDB. Run populate_vectordb.py first. Error: {e}")
-    collection = None
-    embedding_model = None
+    collections = {FLOAT_COLLECTION: chroma_client.get_collection(name=FLOAT_COLLECTION)}
+    try:
+        collections[CYCLE_COLLECTION] = chroma_client.get_collection(name=CYCLE_COLLECTION)
+    except Exception:
+        print(f"⚠️ Collection '{CYCLE_COLLECTION}' not found; retrieving from float summaries only.")
+    return collections
+
+embedding_model_resource = LazyResource("Sentence-transformer model", load_embedding_model)
+collection_resource = LazyResource("ChromaDB collections (run populate_vectordb.py first)", load_collections)
+question_encoder = BatchingEncoder(
+    embedding_model_resource,
+    embedding_executor,
+    max_batch=EMBEDDING_MAX_BATCH,
+    window_ms=EMBEDDING_BATCH_WINDOW_MS,
+    cache_size=EMBEDDING_CACHE_SIZE,
+)
 # --- END OF NEW SECTION ---
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reset_inherited_connections()
+    if STARTUP_MODE == "preload":
+        await warm_up()
+    elif STARTUP_MODE == "warm":
+        app.state.warm_up_task = asyncio.create_task(warm_up())
+    yield
+    await question_encoder.close()
+    embedding_executor.shutdown(wait=False, cancel_futures=True)
+    db_executor.shutdown(wait=False, cancel_futures=True)
+
 app = FastAPI(
     title="OceanGPT API",
     description="API for querying ARGO float data using natural language.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 app.add_middleware(
@@ -50,129 +192,564 @@ DB_HOST = 'localhost'
 DB_PORT = '5432'
 DB_NAME = 'argo_db'
 engine_string = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(engine_string)
+if QUERY_BACKEND == "duckdb":
+    query_executor = DuckDBExecutor(
+        database=DUCKDB_PATH,
+        parquet_path=PARQUET_PATH,
+        threads=DUCKDB_THREADS,
+        memory_limit=DUCKDB_MEMORY_LIMIT,
+        statement_timeout_ms=STATEMENT_TIMEOUT_MS,
+        max_rows=MAX_RESULT_ROWS,
+    )
+    engine = None
+else:
+    query_executor = QueryExecutor(
+        engine_string,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=DB_POOL_RECYCLE_SECONDS,
+        statement_timeout_ms=STATEMENT_TIMEOUT_MS,
+        max_rows=MAX_RESULT_ROWS,
+    )
+    engine = query_executor.engine
+
+# Caches are tied to the data version that load_to_sql.py bumps on every reload
+# (for DuckDB: the size and modification time of the file being queried).
+answer_cache = SemanticAnswerCache(
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    similarity_threshold=ANSWER_CACHE_SIMILARITY,
+    max_bytes=ANSWER_CACHE_MAX_BYTES,
+)
+result_cache = ResultCache(max_bytes=RESULT_CACHE_MAX_BYTES)
+result_store = ResultStore(max_bytes=RESULT_STORE_MAX_BYTES, ttl_seconds=RESULT_STORE_TTL_SECONDS)
+data_version_watcher = DataVersionWatcher(
+    engine,
+    interval=DATA_VERSION_CHECK_SECONDS,
+    read_version=query_executor.data_version if QUERY_BACKEND == "duckdb" else None,
+)
+if QUERY_BACKEND == "duckdb":
+    data_version_watcher.on_change(query_executor.reopen)
+data_version_watcher.on_change(answer_cache.invalidate)
+data_version_watcher.on_change(result_cache.invalidate)
 
 def run_query(query_string: str) -> pd.DataFrame:
     """Executes a SQL query and returns the result as a pandas DataFrame."""
-    return pd.read_sql(text(query_string), engine.connect())
-
-# --- 3. ADVANCED AI CONTEXT (Copied directly from your final app.py) ---
-def get_db_context():
-    """Fetches schema, date range, and unique floats to give the AI better context."""
-    schema_query = "SELECT column_name, data_type FROM information_schema.columns WHERE table_name = 'argo_data'"
-    date_range_query = "SELECT MIN(juld)::date AS min_date, MAX(juld)::date AS max_date FROM argo_data;"
-    platform_query = "SELECT DISTINCT platform_number FROM argo_data ORDER BY platform_number;"
-    
-    schema_df = run_query(schema_query)
-    date_range_df = run_query(date_range_query)
-    platform_df = run_query(platform_query)
+    return query_executor.run_query(query_string)
 
-    schema_info = "\n".join([f"- {row['column_name']} ({row['data_type']})" for _, row in schema_df.iterrows()])
-    date_range_info = f"The data covers dates from {date_range_df['min_date'][0]} to {date_range_df['max_date'][0]}."
-    platform_info = "Available platform_number values include: " + ", ".join(platform_df['platform_number'].astype(str).tolist()[:10]) + ", among others."
+async def run_query_async(query_string: str) -> pd.DataFrame:
+    """Runs `run_query` on the SQL executor with a per-request timeout.
 
-    full_context = f"""
-    You are querying a PostgreSQL table named 'argo_data' with the following schema:
-    {schema_info}
-
-    Contextual Information:
-    - {date_range_info}
-    - {platform_info}
+    Results are served from the result cache when the same (normalized) SQL
+    already ran against the current data version.
     """
-    return full_context
+    data_version = data_version_watcher.version
+    cached = result_cache.get(query_string, data_version)
+    annotate(result_cache="hit" if cached is not None else "miss")
+    if cached is not None:
+        return cached
+    loop = asyncio.get_running_loop()
+    results_df = await asyncio.wait_for(
+        loop.run_in_executor(db_executor, run_query, query_string),
+        timeout=QUERY_TIMEOUT_SECONDS,
+    )
+    result_cache.put(query_string, data_version, results_df)
+    return results_df
 
-DB_CONTEXT = get_db_context()
+# --- 3. ADVANCED AI CONTEXT (precomputed by load_to_sql.py, loaded lazily) ---
+_db_context = {"text": None}
+_db_context_lock = threading.Lock()
+
+def load_db_context() -> str:
+    """Builds the prompt context from the metadata table, falling back to live queries if it's missing."""
+    if QUERY_BACKEND == "duckdb":
+        return format_db_context(query_executor.db_context())
+    raw = read_metadata(engine, DB_CONTEXT_KEY)
+    if raw is not None:
+        return format_db_context(json.loads(raw))
+    print("⚠️ No precomputed DB context found (re-run load_to_sql.py). Computing it from argo_data...")
+    with engine.connect() as conn:
+        return format_db_context(compute_db_context(conn))
+
+def get_db_context() -> str:
+    """Returns the cached schema/date-range/platform context, loading it on first use."""
+    with _db_context_lock:
+        if _db_context["text"] is None:
+            _db_context["text"] = load_db_context()
+        return _db_context["text"]
+
+def refresh_db_context(new_version: str):
+    """Reloads the context in the background; requests keep using the old one until it's ready."""
+    def refresh():
+        context_text = load_db_context()
+        with _db_context_lock:
+            _db_context["text"] = context_text
+    db_executor.submit(refresh)
+
+data_version_watcher.on_change(refresh_db_context)
 
 # --- 4. RAG PIPELINE LOGIC ---
 
 # --- NEW: FUNCTION TO SEARCH THE VECTOR DB ---
-def find_relevant_context(user_question: str) -> str:
+def find_relevant_context(user_question: str, query_embedding=None) -> str:
     """Searches the vector DB for context relevant to the user's question."""
-    if not collection or not embedding_model:
+    collections = collection_resource.get()
+    embedding_model = embedding_model_resource.get()
+    if not collections or not embedding_model:
         return "Vector database not available."
     
-    query_embedding = embedding_model.encode(user_question).tolist()
-    results = collection.query(query_embeddings=[query_embedding], n_results=3)
-    context = "\n---\n".join(results['documents'][0])
+    if query_embedding is None:
+        query_embedding = embedding_model.encode(user_question)
+    # Dates, regions and platform numbers in the question become metadata pre-filters
+    documents = retrieve(collections, user_question, list(map(float, query_embedding)), RETRIEVAL_N_RESULTS)
+    context = "\n---\n".join(documents)
     return context
+
+async def embed_question_async(user_question: str):
+    """Encodes the question through the micro-batching encoder (None if the model couldn't be loaded)."""
+    return await question_encoder.encode(user_question)
+
+async def find_relevant_context_async(user_question: str, query_embedding=None) -> str:
+    """Runs the Chroma lookup (and the embedding, if not given) on the embedding executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(embedding_executor, find_relevant_context, user_question, query_embedding)
 # --- END OF NEW SECTION ---
 
-def get_sql_query(user_question: str, context: str) -> str:
+def get_llm():
+    """Returns the chat model used by both LLM steps (swapped out by the load test).
+
+    Called once by `llm_client`; retries are left to the client layer.
+    """
+    kwargs = {"transport": LLM_TRANSPORT} if LLM_TRANSPORT else {}
+    return ChatGoogleGenerativeAI(model="models/gemini-1.5-flash", google_api_key=GOOGLE_API_KEY, max_retries=0, **kwargs)
+
+# Dialect-specific guidance appended to the SQL prompt rules
+SQL_DIALECTS = {
+    "postgres": (
+        "PostgreSQL",
+        "7. Use PostgreSQL syntax: `juld::date`, `EXTRACT(YEAR FROM juld)`, `DATE_TRUNC('month', juld)`, `juld >= NOW() - INTERVAL '30 days'`.\n",
+    ),
+    "duckdb": (
+        "DuckDB",
+        "7. Use DuckDB syntax: `juld::DATE`, `year(juld)`, `date_trunc('month', juld)`, `strftime(juld, '%Y-%m')`, "
+        "`juld >= now() - INTERVAL 30 DAY`. Prefer `arg_min(x, y)`/`arg_max(x, y)` for 'the x at the lowest/highest y'.\n",
+    ),
+}
+SQL_DIALECT_NAME, SQL_DIALECT_HINTS = SQL_DIALECTS.get(QUERY_BACKEND, SQL_DIALECTS["postgres"])
+
+# This is the perfected prompt, now with a placeholder for the retrieved context.
+SQL_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system",
+         f"You are an expert {SQL_DIALECT_NAME} SQL query writer. Your task is to convert a user's question into a single, syntactically correct SQL query. "
+         "Use the provided **retrieved context** and **database context** to help you write the most accurate query.\n\n"
+         "--- RETRIEVED CONTEXT (from vector search) ---\n{context}\n--------------------------------------------\n\n"
+         "Follow these rules precisely:\n"
+         "1. **For 'highest'/'lowest'/'latest' records (e.g., 'furthest south'), ALWAYS use `ORDER BY` and `LIMIT 1`.** DO NOT use `GROUP BY`. "
+         "   - 'Furthest south' means `ORDER BY latitude ASC LIMIT 1`. 'Furthest west' means `ORDER BY longitude ASC LIMIT 1`.\n"
+         "2. **For aggregates on a 'top N' subset, ALWAYS use a subquery.**\n"
+         "3. **ALWAYS use descriptive aliases for aggregate columns** (e.g., `AVG(temperature) AS average_temperature`).\n"
+         "4. **Interpret geographical terms**: 'equator' means `latitude BETWEEN -5 AND 5`.\n"
+         "5. **Always include columns mentioned by the user.** If asked 'Which float...', you must select `platform_number`.\n"
+         "6. Only output the SQL query. Nothing else.\n"
+         + SQL_DIALECT_HINTS + "\n"
+         "--- DATABASE CONTEXT ---\n{db_context}\n-------------------------"
+        ),
+        ("human", "{question}")
+    ]
+)
+
+SUMMARY_PROMPT = ChatPromptTemplate.from_template(
+    "You are a helpful oceanographic data analyst. The user asked: '{question}'. "
+    "The following data (or, for large results, a statistical digest of it) was retrieved from the database:\n{results}\n\n"
+    "Please provide a concise, natural language summary of the findings."
+)
+
+# One shared model and prebuilt chains for every request (see backend/llm.py)
+llm_client = LLMClient(
+    lambda: get_llm(),
+    prompts={"sql": SQL_PROMPT, "summary": SUMMARY_PROMPT},
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    timeout=LLM_TIMEOUT_SECONDS,
+    max_retries=LLM_MAX_RETRIES,
+    backoff_seconds=LLM_BACKOFF_SECONDS,
+)
+
+async def get_sql_query(user_question: str, context: str) -> str:
     """Converts a user question to a SQL query, using the perfected prompt and new context."""
-    # This is the perfected prompt, now with a placeholder for the retrieved context.
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system",
-             "You are an expert PostgreSQL query writer. Your task is to convert a user's question into a single, syntactically correct SQL query. "
-             "Use the provided **retrieved context** and **database context** to help you write the most accurate query.\n\n"
-             "--- RETRIEVED CONTEXT (from vector search) ---\n{context}\n--------------------------------------------\n\n"
-             "Follow these rules precisely:\n"
-             "1. **For 'highest'/'lowest'/'latest' records (e.g., 'furthest south'), ALWAYS use `ORDER BY` and `LIMIT 1`.** DO NOT use `GROUP BY`. "
-             "   - 'Furthest south' means `ORDER BY latitude ASC LIMIT 1`. 'Furthest west' means `ORDER BY longitude ASC LIMIT 1`.\n"
-             "2. **For aggregates on a 'top N' subset, ALWAYS use a subquery.**\n"
-             "3. **ALWAYS use descriptive aliases for aggregate columns** (e.g., `AVG(temperature) AS average_temperature`).\n"
-             "4. **Interpret geographical terms**: 'equator' means `latitude BETWEEN -5 AND 5`.\n"
-             "5. **Always include columns mentioned by the user.** If asked 'Which float...', you must select `platform_number`.\n"
-             "6. Only output the SQL query. Nothing else.\n\n"
-             "--- DATABASE CONTEXT ---\n{db_context}\n-------------------------"
-            ),
-            ("human", "{question}")
-        ]
+    loop = asyncio.get_running_loop()
+    db_context = await loop.run_in_executor(db_executor, get_db_context)
+    response = await llm_client.ainvoke(
+        "sql", {"question": user_question, "context": context, "db_context": db_context}
     )
-    llm = ChatGoogleGenerativeAI(model="models/gemini-1.5-flash", google_api_key=GOOGLE_API_KEY)
-    chain = prompt | llm
-    response = chain.invoke({"question": user_question, "context": context, "db_context": DB_CONTEXT})
     sql_query = response.content.strip().replace("```sql", "").replace("```", "")
     return sql_query
 
-def get_natural_language_summary(question: str, results_df: pd.DataFrame) -> str:
-    """Generates a natural language summary of the query results."""
+NO_RESULTS_SUMMARY = "I couldn't find any data that matches your query. Please try asking in a different way."
+
+def template_summary(results_df: pd.DataFrame):
+    """Returns a summary that needs no LLM call (empty or single-value results), or None."""
     if results_df.empty:
-        return "I couldn't find any data that matches your query. Please try asking in a different way."
-    
-    results_str = results_df.to_markdown(index=False)
-    prompt = ChatPromptTemplate.from_template(
-        "You are a helpful oceanographic data analyst. The user asked: '{question}'. "
-        "The following data was retrieved from the database:\n{results}\n\n"
-        "Please provide a concise, natural language summary of the findings."
-    )
-    llm = ChatGoogleGenerativeAI(model="models/gemini-1.5-flash", google_api_key=GOOGLE_API_KEY)
-    chain = prompt | llm
-    response = chain.invoke({"question": question, "results": results_str})
+        return NO_RESULTS_SUMMARY
+    if SCALAR_SUMMARY == "template":
+        return scalar_summary(results_df)
+    return None
+
+def summary_inputs(question: str, results_df: pd.DataFrame) -> dict:
+    results_str = digest(results_df, sample_rows=SUMMARY_SAMPLE_ROWS, full_rows=SUMMARY_FULL_ROWS)
+    return {"question": question, "results": results_str}
+
+async def get_natural_language_summary(question: str, results_df: pd.DataFrame) -> str:
+    """Generates a natural language summary of the query results."""
+    summary = template_summary(results_df)
+    if summary is not None:
+        return summary
+    response = await llm_client.ainvoke("summary", summary_inputs(question, results_df))
     return response.content
 
+async def stream_natural_language_summary(question: str, results_df: pd.DataFrame):
+    """Yields the summary piece by piece as the LLM streams it."""
+    summary = template_summary(results_df)
+    if summary is not None:
+        yield summary
+        return
+    async for piece in llm_client.astream("summary", summary_inputs(question, results_df)):
+        yield piece
+
 # --- 5. API ENDPOINT (Updated to use RAG) ---
 class QueryRequest(BaseModel):
     question: str
 
+RESULT_VIEWS = {
+    "map": lambda df, max_points=MAP_MAX_POINTS: spatial_bins(df, max_points),
+    "profile": lambda df, max_points=PROFILE_MAX_POINTS: profile_downsample(df, max_points),
+}
+
+def make_answer(summary: str, results_df: pd.DataFrame, sql_query: str) -> dict:
+    """Builds the cached form of an answer.
+
+    The full result goes to the result store only; the answer keeps the first
+    page and the views, so the answer cache stays small.
+    """
+    first_page, next_cursor = page(results_df, limit=RESULT_PAGE_SIZE)
+    return {
+        "summary": summary,
+        "sql_query": sql_query,
+        "truncated": results_df.attrs.get("truncated", False),
+        "result_id": result_store.put(results_df),
+        "total_rows": len(results_df),
+        "first_page": first_page,
+        "next_cursor": next_cursor,
+        "views": {name: view(results_df) for name, view in RESULT_VIEWS.items()},
+    }
+
+def answer_size(answer: dict) -> int:
+    """Approximate memory held by a cached answer: its first page, views and text."""
+    frames = [answer["first_page"], *(view for view in answer["views"].values() if view is not None)]
+    size = sum(int(df.memory_usage(index=False, deep=True).sum()) for df in frames)
+    return size + len(answer["summary"]) + len(answer["sql_query"])
+
+async def restore_result(answer: dict):
+    """Makes a cached answer's result pageable again if the result store evicted it.
+
+    A result that fits in the first page is put back from the answer; a larger
+    one is re-run (usually from the result cache).
+    """
+    if result_store.get(answer["result_id"]) is not None:
+        return
+    if answer["next_cursor"] is None:
+        result_store.put(answer["first_page"], answer["result_id"])
+        return
+    with stage("query"):
+        results_df = await run_query_async(answer["sql_query"])
+    result_store.put(results_df, answer["result_id"])
+
+def result_fields(answer: dict, cached) -> tuple:
+    """Returns (the answer's metadata fields, its first page)."""
+    fields = {
+        "summary": answer["summary"],
+        "sql_query": answer["sql_query"],
+        "truncated": answer["truncated"],
+        "cached": cached,
+        "result_id": answer["result_id"],
+        "total_rows": answer["total_rows"],
+        "next_cursor": answer["next_cursor"],
+    }
+    return fields, answer["first_page"]
+
+def answer_response(answer: dict, cached, accept: str):
+    """Renders an answer as columnar JSON or, if negotiated, Arrow IPC (first page only; views via /results)."""
+    fields, first_page = result_fields(answer, cached)
+    if wants_arrow(accept):
+        try:
+            return Response(to_arrow_ipc(first_page, fields), media_type=ARROW_MEDIA_TYPE)
+        except (pa.ArrowException, TypeError, ValueError):
+            pass  # Columns Arrow can't represent still go out as JSON
+    views = {name: None if view is None else columnar(view) for name, view in answer["views"].items()}
+    return FastJSONResponse({**fields, "data": columnar(first_page), "views": views})
+
+async def lookup_cached_answer(question: str):
+    """Returns (cached answer or None, "exact"/"semantic"/None, question embedding or None)."""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(db_executor, data_version_watcher.check)
+    cached = answer_cache.get_exact(question)
+    if cached is not None:
+        return cached, "exact", None
+    with stage("embedding"):
+        query_embedding = await embed_question_async(question)
+    if query_embedding is not None:
+        cached = answer_cache.get_similar(question, query_embedding)
+        if cached is not None:
+            return cached, "semantic", query_embedding
+    return None, None, query_embedding
+
+def http_error(e: Exception, trace=None) -> HTTPException:
+    """Maps a pipeline failure to the HTTP error we report, classified by error type and failing stage."""
+    if isinstance(e, HTTPException):
+        return e
+    failed_stage = trace.error_stage if trace is not None else None
+    status_code, code, message = classify_error(e, failed_stage)
+    if status_code >= 500 and code == "internal_error":
+        print(f"❌ ERROR: {type(e).__name__} during {failed_stage or 'request'}: {e}")
+    return HTTPException(status_code=status_code, detail={
+        "error": code,
+        "message": message,
+        "stage": failed_stage,
+        "trace_id": trace.trace_id if trace is not None else None,
+    })
+
 @app.post("/ask")
-def ask_question(request: QueryRequest):
+async def ask_question(request: QueryRequest, http_request: Request):
     """The main API endpoint that now uses the RAG pipeline."""
+    trace = start_trace("/ask", request.question)
     try:
+        # Step 0: Answer from the cache if we've seen this (or a near-identical) question
+        cached, cache_kind, query_embedding = await lookup_cached_answer(request.question)
+        trace.set(cached=cache_kind)
+        accept = http_request.headers.get("accept", "")
+        if cached is not None:
+            await restore_result(cached)
+            with stage("serialization"):
+                response = answer_response(cached, cache_kind, accept)
+            response.headers["X-Trace-Id"] = trace.trace_id
+            return response
+
         # Step 1 (Retrieve): Find relevant context from the vector DB
-        context = find_relevant_context(request.question)
+        with stage("retrieval"):
+            context = await find_relevant_context_async(request.question, query_embedding)
         
         # Step 2 (Augment & Generate): Create the SQL query using the new context and our perfected prompt
-        sql_query = get_sql_query(request.question, context)
+        with stage("sql_generation"):
+            sql_query = await get_sql_query(request.question, context)
+        trace.set(sql=sql_query)
         
         # Step 3: Execute the query
-        results_df = run_query(sql_query)
+        with stage("query"):
+            results_df = await run_query_async(sql_query)
+        trace.set(rows=len(results_df), truncated=results_df.attrs.get("truncated", False))
         
         # Step 4: Generate a natural language summary
-        summary = get_natural_language_summary(request.question, results_df)
-        
-        # Convert data for JSON
-        for col in results_df.select_dtypes(include=['datetime64[ns]']).columns:
-            results_df[col] = results_df[col].astype(str)
-        for col in results_df.columns:
-             if pd.api.types.is_numeric_dtype(results_df[col].dtype):
-                 results_df[col] = results_df[col].apply(lambda x: float(x) if isinstance(x, np.number) else x)
-        results_json = results_df.to_dict(orient='records')
+        with stage("summary"):
+            summary = await get_natural_language_summary(request.question, results_df)
         
-        return {
-            "summary": summary,
-            "data": results_json,
-            "sql_query": sql_query,
-        }
+        with stage("serialization"):
+            answer = make_answer(summary, results_df, sql_query)
+            if query_embedding is not None:
+                answer_cache.put(request.question, query_embedding, answer, answer_size(answer))
+            response = answer_response(answer, None, accept)
+        response.headers["X-Trace-Id"] = trace.trace_id
+        return response
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise http_error(e, trace)
+    finally:
+        trace.finish()
+
+# --- 5b. STREAMING ENDPOINT (Server-Sent Events) ---
+def sse(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+def row_events(first_page: pd.DataFrame):
+    """Yields `rows` events, each a columnar chunk of STREAM_ROW_CHUNK rows."""
+    for offset in range(0, len(first_page), STREAM_ROW_CHUNK):
+        chunk = first_page.iloc[offset:offset + STREAM_ROW_CHUNK]
+        yield sse("rows", {"offset": offset, **columnar(chunk)})
+
+def done_event(answer: dict, fields: dict) -> bytes:
+    views = {name: None if view is None else columnar(view) for name, view in answer["views"].items()}
+    return sse("done", {
+        "truncated": fields["truncated"],
+        "cached": fields["cached"],
+        "result_id": fields["result_id"],
+        "total_rows": fields["total_rows"],
+        "next_cursor": fields["next_cursor"],
+        "views": views,
+    })
+
+async def stream_answer(question: str):
+    """Runs the pipeline and emits each stage as soon as it's available.
+
+    Events, in order: `status` (stage names), `sql`, `rows` (the first result
+    page, in columnar chunks of STREAM_ROW_CHUNK rows), `summary` (tokens as the
+    LLM streams them) and finally `done` with the result ID, paging cursor and
+    map/profile views, or `error` if any stage fails.
+    """
+    trace = start_trace("/ask/stream", question)
+    try:
+        yield sse("status", {"stage": "retrieving"})
+        cached, cache_kind, query_embedding = await lookup_cached_answer(question)
+        trace.set(cached=cache_kind)
+        if cached is not None:
+            await restore_result(cached)
+            with stage("serialization"):
+                fields, first_page = result_fields(cached, cache_kind)
+                events = [sse("sql", {"sql_query": cached["sql_query"]}), *row_events(first_page),
+                          sse("summary", {"token": cached["summary"]}), done_event(cached, fields)]
+            for event in events:
+                yield event
+            return
+
+        with stage("retrieval"):
+            context = await find_relevant_context_async(question, query_embedding)
+        yield sse("status", {"stage": "generating_sql"})
+        with stage("sql_generation"):
+            sql_query = await get_sql_query(question, context)
+        trace.set(sql=sql_query)
+        yield sse("sql", {"sql_query": sql_query})
+
+        yield sse("status", {"stage": "running_query"})
+        with stage("query"):
+            results_df = await run_query_async(sql_query)
+        trace.set(rows=len(results_df), truncated=results_df.attrs.get("truncated", False))
+        with stage("serialization"):
+            events = list(row_events(results_df.iloc[:RESULT_PAGE_SIZE]))
+        for event in events:
+            yield event
+
+        yield sse("status", {"stage": "summarizing"})
+        summary_parts = []
+        # Includes the time spent sending each token to the client
+        with stage("summary"):
+            async for token in stream_natural_language_summary(question, results_df):
+                summary_parts.append(token)
+                yield sse("summary", {"token": token})
+
+        with stage("serialization"):
+            answer = make_answer("".join(summary_parts), results_df, sql_query)
+            if query_embedding is not None:
+                answer_cache.put(question, query_embedding, answer, answer_size(answer))
+            fields, _ = result_fields(answer, None)
+            event = done_event(answer, fields)
+        yield event
+    except Exception as e:
+        error = http_error(e, trace)
+        yield sse("error", {"status": error.status_code, "detail": error.detail})
+    finally:
+        trace.finish()
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: QueryRequest):
+    """Streams the /ask pipeline as Server-Sent Events, so the SQL shows up before the summary is written."""
+    return StreamingResponse(
+        stream_answer(request.question),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- 5c. RESULT PAGING & VIEWS ---
+def stored_result(result_id: str) -> pd.DataFrame:
+    results_df = result_store.get(result_id)
+    if results_df is None:
+        raise HTTPException(status_code=404, detail="This result has expired. Please ask the question again.")
+    return results_df
+
+@app.get("/results/{result_id}")
+async def get_result_page(result_id: str, http_request: Request, cursor: str = None, limit: int = RESULT_PAGE_SIZE):
+    """Returns the page of a stored result starting at `cursor`."""
+    results_df = stored_result(result_id)
+    try:
+        rows, next_cursor = page(results_df, cursor, min(max(limit, 1), MAX_RESULT_ROWS))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    fields = {"result_id": result_id, "total_rows": len(results_df), "next_cursor": next_cursor}
+    if wants_arrow(http_request.headers.get("accept", "")):
+        try:
+            return Response(to_arrow_ipc(rows, fields), media_type=ARROW_MEDIA_TYPE)
+        except (pa.ArrowException, TypeError, ValueError):
+            pass
+    return FastJSONResponse({**fields, "data": columnar(rows)})
+
+@app.get("/results/{result_id}/views/{view}")
+async def get_result_view(result_id: str, view: str, max_points: int = None):
+    """Returns a downsampled view ("map" or "profile") of a stored result, or null if it doesn't apply."""
+    if view not in RESULT_VIEWS:
+        raise HTTPException(status_code=404, detail=f"Unknown view '{view}'. Available: {', '.join(RESULT_VIEWS)}")
+    results_df = stored_result(result_id)
+    kwargs = {} if max_points is None else {"max_points": max(max_points, 3)}
+    loop = asyncio.get_running_loop()
+    view_df = await loop.run_in_executor(db_executor, lambda: RESULT_VIEWS[view](results_df, **kwargs))
+    return FastJSONResponse({"result_id": result_id, "view": view, "data": None if view_df is None else columnar(view_df)})
+
+# --- 6. STARTUP WARM-UP & READINESS ---
+def warm_up_resources():
+    """Loads every heavy resource now instead of on the first request."""
+    embedding_model_resource.get()
+    collection_resource.get()
+    data_version_watcher.check()
+    get_db_context()
+
+def reset_inherited_connections():
+    """Gives this worker its own DB connections.
+
+    Under `gunicorn --preload` the app is imported in the master, so a forked
+    worker would otherwise share the master's pooled sockets or DuckDB handle.
+    `dispose(close=False)` drops the inherited pool without closing the
+    master's connections.
+    """
+    if QUERY_BACKEND == "duckdb":
+        query_executor.reopen()
+    else:
+        engine.dispose(close=False)
+
+async def warm_up():
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(embedding_executor, warm_up_resources)
+    except Exception as e:
+        print(f"❌ ERROR: Warm-up failed, resources will load on first use. Error: {e}")
+
+if STARTUP_MODE == "preload":
+    # Only the model: DB connections and the Chroma client must not be opened before the fork
+    embedding_model_resource.get()
+
+@app.get("/ready")
+def readiness():
+    """Reports which components are warm; 503 until the embedding model, vector store and DB context are loaded."""
+    components = {
+        "embedding_model": embedding_model_resource.status(),
+        "vector_store": collection_resource.status(),
+        "db_context": {"state": "ready" if _db_context["text"] is not None else "cold"},
+    }
+    ready = all(c["state"] == "ready" for c in components.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "startup_mode": STARTUP_MODE, "components": components},
+    )
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics: per-stage and end-to-end latency histograms, result sizes, errors by class."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/stats")
+def get_stats():
+    """Reports connection-pool, query timing, cache and LLM call counters."""
+    return {
+        "database": query_executor.stats(),
+        "embeddings": question_encoder.stats(),
+        "answer_cache": answer_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "result_store": result_store.stats(),
+        "llm": llm_client.stats(),
+        "data_version": data_version_watcher.version,
+    }
\ No newline at end of file
@@ -0,0 +1,274 @@
+# cache.py
+
+"""In-process caches for the /ask pipeline."""
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from backend.retrieval import MONTHS, constraints_from_question
+
+
+def normalize_question(question: str) -> str:
+    """Lower-cases a question and collapses whitespace and trailing punctuation for exact matching."""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?.!")
+
+
+_NUMBER = re.compile(r"-?\d+(?:\.\d+)?(?:\s*°?\s*[nsew]\b)?")
+
+
+def question_fingerprint(question: str) -> tuple:
+    """The specifics an answer depends on: numbers, month names and the constraints retrieval derives from the question.
+
+    Embeddings barely separate "float 2902746 in 2019" from "float 2902747 in
+    2020", so a semantic match is only used when these agree too.
+    """
+    text = normalize_question(question)
+    numbers = tuple(sorted(set(re.sub(r"\s|°", "", n) for n in _NUMBER.findall(text))))
+    months = tuple(month for month in MONTHS if re.search(rf"\b{month}\b", text))
+    constraints = tuple(sorted((name, tuple(value)) for name, value in constraints_from_question(text).items()))
+    return numbers, months, constraints
+
+
+class SemanticAnswerCache:
+    """Caches full /ask answers, looked up by exact question first and then by embedding similarity.
+
+    A similar question only counts as a hit if it has the same numbers and
+    retrieval constraints (dates, regions, platforms) as the cached one.
+
+    Entries are evicted least-recently-used once there are more than
+    `max_entries` or their sizes (as passed to `put`) add up to more than
+    `max_bytes`, and expire after `ttl_seconds`. `invalidate()` drops
+    everything, e.g. when `argo_data` is reloaded.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600,
+        similarity_threshold: float = 0.95,
+        max_bytes: int = 64 * 1024 * 1024,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_bytes = max_bytes
+        # normalized question -> (unit embedding, answer, created_at, fingerprint, size in bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+
+    def _expired(self, created_at: float) -> bool:
+        return time.monotonic() - created_at > self.ttl_seconds
+
+    def _drop(self, key: str):
+        self._bytes -= self._entries.pop(key)[4]
+        self._matrix = None
+
+    def get_exact(self, question: str):
+        """Returns the cached answer for this exact (normalized) question, or None."""
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry[2]):
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            self.hits_exact += 1
+            return entry[1]
+
+    def get_similar(self, question: str, embedding):
+        """Returns the answer of the closest matching cached question above the similarity threshold, or None.
+
+        Call this after `get_exact` missed; a miss here is what counts as a cache miss.
+        """
+        query = _unit(embedding)
+        fingerprint = question_fingerprint(question)
+        with self._lock:
+            if self._entries and self._matrix is None:
+                self._matrix_keys = list(self._entries)
+                self._matrix = np.stack([self._entries[k][0] for k in self._matrix_keys])
+            if self._matrix is not None:
+                scores = self._matrix @ query
+                expired = []
+                answer = None
+                for i in np.argsort(-scores):
+                    if scores[i] < self.similarity_threshold:
+                        break
+                    key = self._matrix_keys[i]
+                    entry = self._entries[key]
+                    if self._expired(entry[2]):
+                        expired.append(key)
+                    elif entry[3] == fingerprint:
+                        self._entries.move_to_end(key)
+                        answer = entry[1]
+                        break
+                for key in expired:
+                    self._drop(key)
+                if answer is not None:
+                    self.hits_semantic += 1
+                    return answer
+            self.misses += 1
+            return None
+
+    def put(self, question: str, embedding, answer, size: int = 0):
+        """Stores an answer of `size` bytes, evicting least recently used entries while the cache is over budget.
+
+        An answer larger than the whole budget isn't stored.
+        """
+        if size > self.max_bytes:
+            return
+        key = normalize_question(question)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (_unit(embedding), answer, time.monotonic(), question_fingerprint(question), size)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._bytes -= self._entries.popitem(last=False)[1][4]
+            self._matrix = None
+
+    def invalidate(self, *_):
+        """Drops every cached answer."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._matrix = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits_exact + self.hits_semantic + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "hit_rate": (self.hits_exact + self.hits_semantic) / lookups if lookups else 0.0,
+            }
+
+
+_SQL_TOKEN = re.compile(
+    r"""(?P<comment>--[^\n]*|/\*.*?\*/)"""
+    r"""|(?P<string>[eE]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*')"""
+    r"""|(?P<dollar>\$(?P<tag>(?:[A-Za-z_]\w*)?)\$.*?\$(?P=tag)\$)"""
+    r"""|(?P<quoted>"(?:[^"]|"")*")"""
+    r"""|(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)"""
+    r"""|(?P<word>[A-Za-z_][A-Za-z0-9_$]*)"""
+    r"""|(?P<op>::|<=|>=|<>|!=|\|\||\S)""",
+    re.DOTALL,
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """Canonicalizes SQL text so trivially different spellings of the same query share a cache key.
+
+    Comments and trailing semicolons are dropped, whitespace is collapsed and
+    unquoted keywords/identifiers are lower-cased. String literals (including
+    E'...' escape strings and $$...$$ / $tag$...$tag$ dollar quoting), quoted
+    identifiers and numeric literals are kept verbatim: `5.0` and `5` have
+    different types (`AVG(x) / 2` is not `AVG(x) / 2.0`), so they must not
+    share a key.
+    """
+    tokens = []
+    for match in _SQL_TOKEN.finditer(sql):
+        kind, token = match.lastgroup, match.group()
+        if kind == "comment":
+            continue
+        if kind == "word":
+            token = token.lower()
+        tokens.append(token)
+    while tokens and tokens[-1] == ";":
+        tokens.pop()
+    return " ".join(tokens)
+
+
+class ResultCache:
+    """Caches query results as Arrow IPC buffers, keyed on (data version, normalized SQL).
+
+    The cache is bounded by the total size of the stored buffers and evicts
+    least-recently-used entries first.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (data version, normalized sql) -> (buffer, attrs)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, sql: str, data_version: str):
+        """Returns a fresh DataFrame for a cached query, or None."""
+        key = (data_version, normalize_sql(sql))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        buffer, attrs = entry
+        df = pa.ipc.open_stream(buffer).read_all().to_pandas()
+        df.attrs.update(attrs)
+        return df
+
+    def put(self, sql: str, data_version: str, df: pd.DataFrame):
+        """Stores a result. Results that Arrow can't represent or that exceed the budget are skipped."""
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowException, TypeError, ValueError):
+            return
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        buffer = sink.getvalue()
+        if buffer.size > self.max_bytes:
+            return
+
+        key = (data_version, normalize_sql(sql))
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[0].size
+            self._entries[key] = (buffer, dict(df.attrs))
+            self._bytes += buffer.size
+            while self._bytes > self.max_bytes:
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+
+    def invalidate(self, *_):
+        """Drops every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def _unit(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,48 @@
+# cache_check.py
+
+"""
+Checks the semantic answer cache's question fingerprints without the vector stack.
+
+Only backend.cache is imported (no Chroma, no embedding model), so this runs
+anywhere the API's dependencies are installed. Exits with status 1 on failure.
+
+Usage (from the repository root):
+    python -m backend.cache_check
+"""
+
+import sys
+
+from backend.cache import question_fingerprint
+
+# Near-identical questions the semantic answer cache must keep apart (different fingerprints)
+DIFFERENT_PAIRS = [
+    ("What is the warmest float in the Antarctic?", "What is the warmest float in the Arctic?"),
+    ("Which floats were near the equator?", "Which floats were in the southern ocean?"),
+    ("Show float 53555 data from 2002", "Show float 53546 data from 2002"),
+    ("Show float 53555 data from 2002", "Show float 53555 data from 2003"),
+    ("Which floats were active in March 2001?", "Which floats were active in April 2001?"),
+]
+# Spellings of the same question that may share an answer (same fingerprint)
+SAME_PAIRS = [
+    ("What is the warmest float in the Arctic?", "what is the warmest float in the arctic"),
+    ("Show float 53555 data from 2002", "Display the data of float 53555 in 2002"),
+]
+
+
+def check_fingerprints() -> bool:
+    ok = True
+    for first, second in DIFFERENT_PAIRS:
+        if question_fingerprint(first) == question_fingerprint(second):
+            print(f"❌ question_fingerprint gives {first!r} and {second!r} the same fingerprint")
+            ok = False
+    for first, second in SAME_PAIRS:
+        if question_fingerprint(first) != question_fingerprint(second):
+            print(f"❌ question_fingerprint gives {first!r} and {second!r} different fingerprints")
+            ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    if not check_fingerprints():
+        sys.exit(1)
+    print(f"✅ {len(DIFFERENT_PAIRS) + len(SAME_PAIRS)} fingerprint checks passed.")
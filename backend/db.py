@@ -0,0 +1,354 @@
+# db.py
+
+"""Query execution layer for LLM-written SQL.
+
+Two interchangeable backends, both with a statement timeout and a row cap:
+  - QueryExecutor  : PostgreSQL through a sized SQLAlchemy connection pool
+  - DuckDBExecutor : in-process DuckDB, over a file built by load_to_duckdb.py
+                     or directly over the parquet file
+"""
+
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy import create_engine, text
+from sqlalchemy import exc as sa_exc
+
+from backend.metadata import COLUMN_TYPES, DB_CONTEXT_KEY, DEDUP_KEY, METADATA_TABLE, SAMPLE_PLATFORMS
+
+# How a query ended; every query's duration is recorded under one of these
+QUERY_OUTCOMES = ("ok", "timeout", "error")
+# SQLSTATE of a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+
+
+def _outcome_metrics() -> dict:
+    return {
+        "queries_by_outcome": dict.fromkeys(QUERY_OUTCOMES, 0),
+        "query_seconds_by_outcome": dict.fromkeys(QUERY_OUTCOMES, 0.0),
+    }
+
+
+def _copy_metrics(metrics: dict) -> dict:
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in metrics.items()}
+
+
+def duckdb_type(postgres_type: str) -> str:
+    return {"DOUBLE PRECISION": "DOUBLE"}.get(postgres_type, postgres_type)
+
+
+def parquet_rows_sql(conn, parquet_path: str) -> str:
+    """DuckDB SELECT over a parquet file with argo_data's column types and without duplicate keys.
+
+    Matches what load_to_sql.py loads into PostgreSQL: columns are cast to
+    COLUMN_TYPES, pandas index columns are left out, and only the first row (in
+    file order) of each DEDUP_KEY group is kept.
+    """
+    source = "read_parquet('{}', file_row_number = true)".format(parquet_path.replace("'", "''"))
+    columns = [row[0] for row in conn.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+    select = ",\n".join(
+        f"TRY_CAST({c} AS {duckdb_type(COLUMN_TYPES[c])}) AS {c}" if c in COLUMN_TYPES else c
+        for c in columns
+        # Files written by pandas carry their index as an extra column; keep it out of the schema
+        if c != "file_row_number" and not c.startswith("__index_level_")
+    )
+    return (
+        f"SELECT * EXCLUDE (file_row_number)\n"
+        f"FROM (SELECT {select}, file_row_number FROM {source})\n"
+        f"QUALIFY row_number() OVER (PARTITION BY {', '.join(DEDUP_KEY)} ORDER BY file_row_number) = 1"
+    )
+
+
+class QueryExecutor:
+    """Runs SQL against a pooled engine and keeps simple checkout/query timing metrics."""
+
+    dialect = "postgres"
+
+    def __init__(
+        self,
+        url: str,
+        pool_size: int = 5,
+        max_overflow: int = 5,
+        pool_timeout: float = 10,
+        pool_recycle: int = 1800,
+        statement_timeout_ms: int = 15000,
+        max_rows: int = 10000,
+    ):
+        self.engine = create_engine(
+            url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_recycle=pool_recycle,
+            pool_pre_ping=True,
+        )
+        self.statement_timeout_ms = statement_timeout_ms
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._metrics = {
+            "checkouts": 0,
+            "checkout_seconds_total": 0.0,
+            "checkout_seconds_max": 0.0,
+            "checkout_timeouts": 0,
+            "checkout_errors": 0,
+            "queries": 0,
+            "query_seconds_total": 0.0,
+            "query_seconds_max": 0.0,
+            "truncated_results": 0,
+            **_outcome_metrics(),
+        }
+
+    def _record(self, checkout_seconds: float, query_seconds: float, outcome: str, truncated: bool):
+        """Records one run_query call; `query_seconds` is None when no connection was checked out."""
+        with self._lock:
+            m = self._metrics
+            if query_seconds is None:
+                m["checkout_timeouts" if outcome == "timeout" else "checkout_errors"] += 1
+                return
+            m["checkouts"] += 1
+            m["checkout_seconds_total"] += checkout_seconds
+            m["checkout_seconds_max"] = max(m["checkout_seconds_max"], checkout_seconds)
+            m["queries"] += 1
+            m["query_seconds_total"] += query_seconds
+            m["query_seconds_max"] = max(m["query_seconds_max"], query_seconds)
+            m["queries_by_outcome"][outcome] += 1
+            m["query_seconds_by_outcome"][outcome] += query_seconds
+            m["truncated_results"] += int(truncated)
+
+    @staticmethod
+    def _is_timeout(e: BaseException) -> bool:
+        if isinstance(e, sa_exc.TimeoutError):
+            return True
+        orig = getattr(e, "orig", None)
+        return (getattr(orig, "pgcode", None) or getattr(orig, "sqlstate", None)) == QUERY_CANCELED
+
+    def run_query(self, query_string: str, max_rows: int = None) -> pd.DataFrame:
+        """Executes a SQL query and returns at most `max_rows` rows as a DataFrame.
+
+        The connection is always returned to the pool. `df.attrs["truncated"]`
+        is True when the query produced more rows than the cap. The duration is
+        recorded whether the query succeeds, hits the statement timeout or fails.
+        """
+        limit = max_rows or self.max_rows
+        start = time.perf_counter()
+        checked_out = None
+        outcome, truncated = "error", False
+        try:
+            with self.engine.connect() as conn:
+                checked_out = time.perf_counter()
+                with conn.begin():
+                    # SET LOCAL only lasts until the end of this transaction, so the
+                    # timeout never leaks to the next user of the pooled connection.
+                    conn.exec_driver_sql(f"SET LOCAL statement_timeout = {int(self.statement_timeout_ms)}")
+                    result = conn.execution_options(stream_results=True).execute(text(query_string))
+                    columns = list(result.keys())
+                    rows = result.fetchmany(limit + 1)
+                    result.close()
+            outcome, truncated = "ok", len(rows) > limit
+        except Exception as e:
+            if self._is_timeout(e):
+                outcome = "timeout"
+            raise
+        finally:
+            finished = time.perf_counter()
+            if checked_out is None:
+                self._record(finished - start, None, outcome, truncated)
+            else:
+                self._record(checked_out - start, finished - checked_out, outcome, truncated)
+
+        df = pd.DataFrame.from_records(rows[:limit], columns=columns, coerce_float=True)
+        df.attrs["truncated"] = truncated
+        return df
+
+    def stats(self) -> dict:
+        """Returns pool occupancy plus checkout/query timing counters."""
+        pool = self.engine.pool
+        with self._lock:
+            metrics = _copy_metrics(self._metrics)
+        checkouts = metrics["checkouts"] or 1
+        metrics["checkout_ms_avg"] = metrics["checkout_seconds_total"] / checkouts * 1000
+        metrics["query_ms_avg"] = metrics["query_seconds_total"] / checkouts * 1000
+        metrics["pool"] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "idle": pool.checkedin(),
+        }
+        return metrics
+
+
+class DuckDBExecutor:
+    """Runs SQL in-process with DuckDB and keeps query timing metrics.
+
+    With `database`, the DuckDB file written by load_to_duckdb.py is opened
+    read-only. Otherwise `table_name` is a view over `parquet_path`, so queries
+    scan the parquet file directly and always see its current contents. The
+    view applies the same column types and dedup as the loaders
+    (parquet_rows_sql), so both modes and PostgreSQL return the same rows. Each
+    query gets its own cursor, which is safe to use from the API's DB threads.
+    """
+
+    dialect = "duckdb"
+
+    def __init__(
+        self,
+        database: str = None,
+        parquet_path: str = "argo_final_data.parquet",
+        table_name: str = "argo_data",
+        threads: int = None,
+        memory_limit: str = None,
+        statement_timeout_ms: int = 15000,
+        max_rows: int = 10000,
+    ):
+        self.database = database
+        self.parquet_path = parquet_path
+        self.table_name = table_name
+        self.threads = threads
+        self.memory_limit = memory_limit
+        self.statement_timeout_ms = statement_timeout_ms
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._metrics = {
+            "queries": 0,
+            "query_seconds_total": 0.0,
+            "query_seconds_max": 0.0,
+            "timeouts": 0,
+            "truncated_results": 0,
+            **_outcome_metrics(),
+        }
+        self._conn = self._connect()
+
+    @property
+    def source(self) -> str:
+        return self.database or self.parquet_path
+
+    def _connect(self):
+        import duckdb
+
+        config = {}
+        if self.threads:
+            config["threads"] = self.threads
+        if self.memory_limit:
+            config["memory_limit"] = self.memory_limit
+        if self.database:
+            return duckdb.connect(self.database, read_only=True, config=config)
+
+        conn = duckdb.connect(":memory:", config=config)
+        conn.execute(f"CREATE VIEW {self.table_name} AS {parquet_rows_sql(conn, self.parquet_path)}")
+        return conn
+
+    def reopen(self, *_):
+        """Reconnects so a rebuilt DuckDB file (or a parquet file with new columns) is picked up."""
+        conn = self._connect()
+        with self._lock:
+            self._conn = conn
+
+    def data_version(self) -> str:
+        """A version string for the data: the source file's size and modification time."""
+        stat = os.stat(self.source)
+        return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+    def run_query(self, query_string: str, max_rows: int = None) -> pd.DataFrame:
+        """Executes a SQL query and returns at most `max_rows` rows as a DataFrame.
+
+        Results are read as Arrow record batches, and reading stops once the cap is
+        passed. A query that runs past the statement timeout is interrupted and
+        raises TimeoutError. `df.attrs["truncated"]` works as in QueryExecutor.
+        """
+        import duckdb
+
+        limit = max_rows or self.max_rows
+        with self._lock:
+            cursor = self._conn.cursor()
+        timer = threading.Timer(self.statement_timeout_ms / 1000, cursor.interrupt)
+        start = time.perf_counter()
+        outcome, truncated = "error", False
+        timer.start()
+        try:
+            cursor.execute(query_string)
+            reader = cursor.fetch_record_batch(min(limit + 1, 100_000))
+            batches, fetched = [], 0
+            for batch in reader:
+                batches.append(batch)
+                fetched += batch.num_rows
+                if fetched > limit:
+                    break
+            table = pa.Table.from_batches(batches, schema=reader.schema)
+            outcome, truncated = "ok", table.num_rows > limit
+        except duckdb.InterruptException:
+            outcome = "timeout"
+            raise TimeoutError(f"Query exceeded the {self.statement_timeout_ms} ms statement timeout")
+        finally:
+            timer.cancel()
+            cursor.close()
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                m = self._metrics
+                m["queries"] += 1
+                m["query_seconds_total"] += elapsed
+                m["query_seconds_max"] = max(m["query_seconds_max"], elapsed)
+                m["queries_by_outcome"][outcome] += 1
+                m["query_seconds_by_outcome"][outcome] += elapsed
+                m["timeouts"] += int(outcome == "timeout")
+                m["truncated_results"] += int(truncated)
+
+        df = table.slice(0, limit).to_pandas()
+        df.attrs["truncated"] = truncated
+        return df
+
+    def db_context(self) -> dict:
+        """Returns the prompt context for this backend, in the format of metadata.compute_db_context.
+
+        DuckDB files written by load_to_duckdb.py carry a precomputed context;
+        for the parquet view it's computed here (one scan of the file).
+        """
+        with self._lock:
+            cursor = self._conn.cursor()
+        try:
+            has_metadata = cursor.execute(
+                "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [METADATA_TABLE]
+            ).fetchone()[0]
+            if has_metadata:
+                row = cursor.execute(f"SELECT value FROM {METADATA_TABLE} WHERE key = ?", [DB_CONTEXT_KEY]).fetchone()
+                if row is not None:
+                    return json.loads(row[0])
+            return compute_duckdb_context(cursor, self.table_name)
+        finally:
+            cursor.close()
+
+    def stats(self) -> dict:
+        """Returns query timing counters and the data source."""
+        with self._lock:
+            metrics = _copy_metrics(self._metrics)
+        queries = metrics["queries"] or 1
+        metrics["query_ms_avg"] = metrics["query_seconds_total"] / queries * 1000
+        metrics["backend"] = self.dialect
+        metrics["source"] = self.source
+        return metrics
+
+
+def compute_duckdb_context(conn, table_name: str = "argo_data", summary_tables: list = None) -> dict:
+    """DuckDB counterpart of metadata.compute_db_context, for a raw duckdb connection."""
+    def schema(table):
+        return [[name, data_type] for name, data_type, *_ in conn.execute(f"DESCRIBE {table}").fetchall()]
+
+    min_date, max_date = conn.execute(f"SELECT MIN(juld)::DATE, MAX(juld)::DATE FROM {table_name}").fetchone()
+    platforms = conn.execute(
+        f"SELECT DISTINCT platform_number FROM {table_name} ORDER BY platform_number LIMIT {SAMPLE_PLATFORMS}"
+    ).fetchall()
+    return {
+        "dialect": "duckdb",
+        "table": table_name,
+        "schema": schema(table_name),
+        "min_date": str(min_date),
+        "max_date": str(max_date),
+        "platforms": [str(p) for (p,) in platforms],
+        "summary_tables": [
+            {"name": t["name"], "description": t["description"], "schema": schema(t["name"])}
+            for t in summary_tables or []
+        ],
+    }
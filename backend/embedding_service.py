@@ -0,0 +1,40 @@
+# embedding_service.py
+
+"""
+A tiny local service that holds one copy of the sentence-transformer model.
+
+Run it once per machine and point the API workers at it with
+EMBEDDING_SERVICE_URL, so N workers don't each load (and keep resident) their
+own copy of the model:
+
+    uvicorn backend.embedding_service:app --port 8001
+    EMBEDDING_SERVICE_URL=http://127.0.0.1:8001 uvicorn backend.api:app --workers 4
+"""
+
+import os
+
+from fastapi import FastAPI
+from pydantic import BaseModel
+from backend.resources import load_sentence_transformer
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.getenv("EMBEDDING_ONNX_FILE")
+
+model = load_sentence_transformer(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_ONNX_FILE)
+app = FastAPI(title="OceanGPT Embedding Service")
+
+
+class EncodeRequest(BaseModel):
+    texts: list[str]
+
+
+@app.get("/health")
+def health():
+    return {"model": EMBEDDING_MODEL_NAME}
+
+
+@app.post("/encode")
+def encode(request: EncodeRequest):
+    """Encodes a batch of texts. Sync `def`, so FastAPI runs it on its threadpool."""
+    return {"embeddings": model.encode(request.texts).tolist()}
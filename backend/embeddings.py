@@ -0,0 +1,135 @@
+# embeddings.py
+
+"""Micro-batching question encoder for the API.
+
+Concurrent /ask requests each need one embedding. Instead of N single-string
+`encode` calls, requests arriving within a short window are encoded together
+in one batch, and recent questions are answered from an LRU cache.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class BatchingEncoder:
+    """Collects encode requests for up to `window_ms` (or `max_batch` items) and encodes them as one batch."""
+
+    def __init__(self, model_resource, executor, max_batch: int = 32, window_ms: float = 5.0, cache_size: int = 10000):
+        self.model_resource = model_resource
+        self.executor = executor
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._pending = []  # (text, future, enqueued_at)
+        self._flush_handle = None
+        self._flush_tasks = set()  # the loop only keeps weak references to tasks
+        self._metrics = {
+            "batches": 0,
+            "encoded": 0,
+            "max_batch_size": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+            "encode_seconds_total": 0.0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+        }
+
+    async def encode(self, text: str):
+        """Returns the embedding for `text`, or None if the model couldn't be loaded."""
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            self._metrics["cache_hits"] += 1
+            return cached
+        self._metrics["cache_misses"] += 1
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        if len(self._pending) >= self.max_batch:
+            self._schedule_flush(loop, delay=0)
+        elif self._flush_handle is None:
+            self._schedule_flush(loop, delay=self.window)
+        return await future
+
+    def _schedule_flush(self, loop, delay: float):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+        self._flush_handle = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        task = asyncio.ensure_future(self._flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self):
+        self._flush_handle = None
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            self._schedule_flush(asyncio.get_running_loop(), delay=0)
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        texts = list(dict.fromkeys(text for text, _, _ in batch))  # identical questions are encoded once
+        loop = asyncio.get_running_loop()
+        try:
+            embeddings = await loop.run_in_executor(self.executor, self._encode_batch, texts)
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        by_text = dict(zip(texts, embeddings)) if embeddings is not None else {}
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(by_text.get(text))
+        for text, embedding in by_text.items():
+            self._cache[text] = embedding
+            self._cache.move_to_end(text)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+        m = self._metrics
+        waits = [started - enqueued for _, _, enqueued in batch]
+        m["batches"] += 1
+        m["encoded"] += len(texts)
+        m["max_batch_size"] = max(m["max_batch_size"], len(texts))
+        m["queue_wait_seconds_total"] += sum(waits)
+        m["queue_wait_seconds_max"] = max(m["queue_wait_seconds_max"], max(waits))
+        m["encode_seconds_total"] += time.perf_counter() - started
+
+    async def close(self):
+        """Cancels scheduled and running flushes, and any encodes still waiting for one."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        tasks = list(self._flush_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        pending, self._pending = self._pending, []
+        for _, future, _ in pending:
+            future.cancel()
+
+    def _encode_batch(self, texts: list):
+        model = self.model_resource.get()
+        return None if model is None else model.encode(texts)
+
+    def stats(self) -> dict:
+        m = dict(self._metrics)
+        batches = m["batches"] or 1
+        lookups = m["cache_hits"] + m["cache_misses"]
+        m["avg_batch_size"] = m["encoded"] / batches
+        m["queue_wait_ms_avg"] = m["queue_wait_seconds_total"] / max(m["cache_misses"], 1) * 1000
+        m["encode_ms_avg"] = m["encode_seconds_total"] / batches * 1000
+        m["cache_entries"] = len(self._cache)
+        m["cache_hit_rate"] = m["cache_hits"] / lookups if lookups else 0.0
+        return m
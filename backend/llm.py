@@ -0,0 +1,255 @@
+# llm.py
+
+"""Long-lived LLM client layer.
+
+One chat model instance is created on first use and shared by every request,
+so its HTTP/gRPC connections are reused. The chains (prompt | model) are also
+built once. Calls go through a concurrency limit and a per-attempt timeout.
+Transient failures (rate limits, 5xx, dropped connections) are retried with
+exponential backoff and jitter. Latency, retries and token counts are recorded
+per chain.
+
+Errors are classified by HTTP status rather than by exception class, since
+each Gemini SDK raises its own types: google.api_core exceptions (older
+langchain-google-genai), google.genai `ClientError`/`ServerError` and the
+`GoogleRateLimitError`/`GoogleAPIError` wrappers of langchain-google-genai 4.x.
+"""
+
+import asyncio
+import contextlib
+import random
+import threading
+import time
+
+
+RETRYABLE_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+# The caller went away (e.g. a closed SSE stream): counted as cancelled, not as an error
+CANCELLATIONS = (asyncio.CancelledError, GeneratorExit)
+
+
+def _transport_errors() -> tuple:
+    errors = [ConnectionError]
+    try:
+        import httpx
+
+        errors.append(httpx.TransportError)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+def _status_of(e: BaseException):
+    for attr in ("code", "status_code"):
+        value = getattr(e, attr, None)
+        if value is not None and not isinstance(value, bool):
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                pass
+    # langchain-core's classified model errors carry no status of their own
+    names = {cls.__name__ for cls in type(e).__mro__}
+    if "ModelRateLimitError" in names:
+        return 429
+    if "ModelAPIError" in names:
+        return 500
+    return None
+
+
+def error_status(e: BaseException):
+    """The HTTP status behind an LLM error, looking through wrapped causes; None if there isn't one."""
+    seen = set()
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        status = _status_of(e)
+        if status is not None and 100 <= status < 600:
+            return status
+        e = e.__cause__ or e.__context__
+    return None
+
+
+class LLMClient:
+    """Runs named, prebuilt chains against a shared chat model.
+
+    `model_factory()` is called once, on first use. `prompts` maps chain names
+    to prompt templates; each chain is built as `prompt | model` the first time
+    it's needed.
+    """
+
+    def __init__(
+        self,
+        model_factory,
+        prompts: dict,
+        max_concurrency: int = 8,
+        timeout: float = 60,
+        max_retries: int = 2,
+        backoff_seconds: float = 0.5,
+        max_backoff_seconds: float = 8,
+    ):
+        self._model_factory = model_factory
+        self._prompts = dict(prompts)
+        self._model = None
+        self._chains = {}
+        self._build_lock = threading.Lock()
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self._transport_errors = _transport_errors()
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._in_flight = 0
+        self._metrics = {}
+
+    def chain(self, name: str):
+        """Returns the prebuilt `prompt | model` chain for `name`."""
+        chain = self._chains.get(name)
+        if chain is None:
+            with self._build_lock:
+                if self._model is None:
+                    self._model = self._model_factory()
+                chain = self._chains.get(name)
+                if chain is None:
+                    chain = self._chains[name] = self._prompts[name] | self._model
+        return chain
+
+    def reset(self):
+        """Drops the model and chains so they're rebuilt (e.g. after swapping `model_factory`)."""
+        with self._build_lock:
+            self._model = None
+            self._chains = {}
+
+    def retryable(self, e: BaseException) -> bool:
+        """Rate limits, server errors and dropped connections are worth another attempt."""
+        return isinstance(e, self._transport_errors) or error_status(e) in RETRYABLE_STATUSES
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_seconds * 2 ** attempt, self.max_backoff_seconds)
+        return delay * (0.5 + random.random() / 2)
+
+    def _record(self, name: str, seconds: float, retries: int, error: bool, usage: dict = None, cancelled: bool = False):
+        with self._lock:
+            m = self._metrics.setdefault(name, {
+                "calls": 0,
+                "errors": 0,
+                "cancelled": 0,
+                "retries": 0,
+                "latency_seconds_total": 0.0,
+                "latency_seconds_max": 0.0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+            })
+            m["calls"] += 1
+            m["errors"] += int(error)
+            m["cancelled"] += int(cancelled)
+            m["retries"] += retries
+            m["latency_seconds_total"] += seconds
+            m["latency_seconds_max"] = max(m["latency_seconds_max"], seconds)
+            if usage:
+                m["input_tokens"] += usage.get("input_tokens", 0)
+                m["output_tokens"] += usage.get("output_tokens", 0)
+
+    async def _acquire(self):
+        with self._lock:
+            self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        with self._lock:
+            self._in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._semaphore.release()
+
+    async def ainvoke(self, name: str, inputs: dict):
+        """Invokes chain `name` and returns its message, retrying transient failures."""
+        chain = self.chain(name)
+        start = time.perf_counter()
+        attempt = 0
+        await self._acquire()
+        try:
+            while True:
+                try:
+                    response = await asyncio.wait_for(chain.ainvoke(inputs), timeout=self.timeout)
+                    break
+                except Exception as e:
+                    if attempt >= self.max_retries or not self.retryable(e):
+                        raise
+                    await asyncio.sleep(self._backoff(attempt))
+                    attempt += 1
+        except CANCELLATIONS:
+            self._record(name, time.perf_counter() - start, attempt, error=False, cancelled=True)
+            raise
+        except Exception:
+            self._record(name, time.perf_counter() - start, attempt, error=True)
+            raise
+        finally:
+            self._release()
+        self._record(name, time.perf_counter() - start, attempt, error=False,
+                     usage=getattr(response, "usage_metadata", None))
+        return response
+
+    async def astream(self, name: str, inputs: dict):
+        """Streams chain `name`, yielding text pieces.
+
+        Transient failures are retried only before the first piece arrives;
+        after that the caller has already forwarded output. The timeout applies
+        to each wait for the next chunk, not to the whole stream, so time spent
+        in the caller between pieces (e.g. a slow SSE client) never counts.
+        """
+        chain = self.chain(name)
+        start = time.perf_counter()
+        attempt = 0
+        usage = {}
+        await self._acquire()
+        try:
+            while True:
+                started = False
+                try:
+                    async with contextlib.aclosing(chain.astream(inputs)) as stream:
+                        while True:
+                            # Only the wait for the model is timed: a timeout must not fire while paused at `yield`
+                            async with asyncio.timeout(self.timeout):
+                                chunk = await anext(stream, None)
+                            if chunk is None:
+                                break
+                            started = True
+                            for key, value in (getattr(chunk, "usage_metadata", None) or {}).items():
+                                if isinstance(value, int):
+                                    usage[key] = usage.get(key, 0) + value
+                            if chunk.content:
+                                yield chunk.content
+                    break
+                except Exception as e:
+                    if started or attempt >= self.max_retries or not self.retryable(e):
+                        raise
+                    await asyncio.sleep(self._backoff(attempt))
+                    attempt += 1
+        except CANCELLATIONS:
+            self._record(name, time.perf_counter() - start, attempt, error=False, usage=usage, cancelled=True)
+            raise
+        except BaseException:
+            self._record(name, time.perf_counter() - start, attempt, error=True, usage=usage)
+            raise
+        finally:
+            self._release()
+        self._record(name, time.perf_counter() - start, attempt, error=False, usage=usage)
+
+    def stats(self) -> dict:
+        with self._lock:
+            chains = {}
+            for name, m in self._metrics.items():
+                chains[name] = dict(m)
+                chains[name]["latency_ms_avg"] = m["latency_seconds_total"] / (m["calls"] or 1) * 1000
+            return {
+                "model_loaded": self._model is not None,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "chains": chains,
+            }
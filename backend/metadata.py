@@ -0,0 +1,241 @@
+# metadata.py
+
+"""Small key/value metadata table shared by the ingestion scripts and the API.
+
+`load_to_sql.py` bumps `data_version` every time `argo_data` is reloaded; the
+API polls it (cheaply, on a timer) to know when its caches are stale. The
+ingestion also stores the schema/date-range/platform context the LLM prompt
+needs, so the API never has to scan `argo_data` to build it.
+
+The layout of `argo_data` (column types and the key rows are unique on) is
+also defined here, so every backend loads the parquet file the same way.
+"""
+
+import json
+import threading
+import time
+
+from sqlalchemy import inspect, text
+
+METADATA_TABLE = "argo_metadata"
+DATA_VERSION_KEY = "data_version"
+DB_CONTEXT_KEY = "db_context"
+CHANGED_PLATFORMS_KEY = "changed_platforms"
+ALL_PLATFORMS = "*"
+SAMPLE_PLATFORMS = 10
+
+# Rows are unique on this key: full loads drop duplicates, incremental loads skip them
+DEDUP_KEY = ("platform_number", "cycle_number", "pressure")
+# Explicit (PostgreSQL) column types instead of "TEXT / float64 everywhere". Columns not
+# listed fall back to a type derived from the parquet schema.
+COLUMN_TYPES = {
+    "platform_number": "TEXT",
+    "cycle_number": "INTEGER",
+    "juld": "TIMESTAMP",
+    "latitude": "DOUBLE PRECISION",
+    "longitude": "DOUBLE PRECISION",
+    "pressure": "REAL",
+    "temperature": "REAL",
+    "salinity": "REAL",
+}
+
+
+def ensure_metadata_table(conn):
+    """Creates the metadata table if it doesn't exist yet."""
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {METADATA_TABLE} ("
+        " key TEXT PRIMARY KEY,"
+        " value TEXT NOT NULL,"
+        " updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+
+def write_metadata(conn, key: str, value: str):
+    """Inserts or replaces a single metadata value."""
+    ensure_metadata_table(conn)
+    conn.execute(
+        text(
+            f"INSERT INTO {METADATA_TABLE} (key, value, updated_at) VALUES (:key, :value, CURRENT_TIMESTAMP) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at"
+        ),
+        {"key": key, "value": value},
+    )
+
+
+def read_metadata(engine, key: str, default: str = None) -> str:
+    """Reads a single metadata value, returning `default` if the table or key is missing."""
+    if not inspect(engine).has_table(METADATA_TABLE):
+        return default
+    with engine.connect() as conn:
+        value = conn.execute(
+            text(f"SELECT value FROM {METADATA_TABLE} WHERE key = :key"), {"key": key}
+        ).scalar()
+    return default if value is None else value
+
+
+def bump_data_version(conn) -> str:
+    """Increments the data version. Call this inside the transaction that reloads `argo_data`."""
+    ensure_metadata_table(conn)
+    current = conn.execute(
+        text(f"SELECT value FROM {METADATA_TABLE} WHERE key = :key"), {"key": DATA_VERSION_KEY}
+    ).scalar()
+    new_version = str(int(current or 0) + 1)
+    write_metadata(conn, DATA_VERSION_KEY, new_version)
+    return new_version
+
+
+def _table_schema(conn, table: str) -> list:
+    rows = conn.execute(
+        text("SELECT column_name, data_type FROM information_schema.columns WHERE table_name = :table ORDER BY ordinal_position"),
+        {"table": table},
+    ).fetchall()
+    return [[name, data_type] for name, data_type in rows]
+
+
+def compute_db_context(conn, table_name: str = "argo_data", source_table: str = None, summary_tables: list = None) -> dict:
+    """Collects the schema, date range and a sample of platform numbers for `table_name`.
+
+    This scans the table, so it belongs in ingestion, not on the API's request path.
+    Pass `source_table` to read from a staging table that will be renamed to `table_name`.
+    `summary_tables` is a list of `{"name", "source", "description"}` dicts for the
+    precomputed summary tables the LLM should know about.
+    """
+    source_table = source_table or table_name
+    schema = _table_schema(conn, source_table)
+    min_date, max_date = conn.execute(
+        text(f"SELECT MIN(juld)::date AS min_date, MAX(juld)::date AS max_date FROM {source_table}")
+    ).one()
+    platforms = conn.execute(
+        text(f"SELECT DISTINCT platform_number FROM {source_table} ORDER BY platform_number LIMIT {SAMPLE_PLATFORMS}")
+    ).scalars().all()
+    return {
+        "table": table_name,
+        "schema": schema,
+        "min_date": str(min_date),
+        "max_date": str(max_date),
+        "platforms": [str(p) for p in platforms],
+        "summary_tables": [
+            {"name": t["name"], "description": t["description"], "schema": _table_schema(conn, t.get("source", t["name"]))}
+            for t in summary_tables or []
+        ],
+    }
+
+
+def store_db_context(conn, table_name: str = "argo_data", source_table: str = None, summary_tables: list = None) -> dict:
+    """Computes the DB context and saves it in the metadata table."""
+    context = compute_db_context(conn, table_name, source_table, summary_tables)
+    write_metadata(conn, DB_CONTEXT_KEY, json.dumps(context))
+    return context
+
+
+DIALECT_NAMES = {"postgres": "PostgreSQL", "duckdb": "DuckDB"}
+
+
+def format_db_context(context: dict) -> str:
+    """Renders the stored DB context as the text block used in the SQL prompt."""
+    schema_info = "\n".join(f"- {name} ({data_type})" for name, data_type in context["schema"])
+    date_range_info = f"The data covers dates from {context['min_date']} to {context['max_date']}."
+    platform_info = "Available platform_number values include: " + ", ".join(context["platforms"]) + ", among others."
+
+    full_context = f"""
+    You are querying a {DIALECT_NAMES[context.get('dialect', 'postgres')]} table named '{context['table']}' with the following schema:
+    {schema_info}
+
+    Contextual Information:
+    - {date_range_info}
+    - {platform_info}
+    """
+    summary_tables = context.get("summary_tables") or []
+    if summary_tables:
+        full_context += (
+            f"\n    Precomputed summary tables (far smaller than '{context['table']}'). "
+            "Prefer them whenever the question can be answered per float or per profile/cycle:\n"
+        )
+        for table in summary_tables:
+            columns = ", ".join(f"{name} ({data_type})" for name, data_type in table["schema"])
+            full_context += f"    - {table['name']}: {table['description']} Columns: {columns}\n"
+    return full_context
+
+
+def mark_platforms_changed(conn, platforms):
+    """Records floats whose data changed so populate_vectordb.py can refresh only their summaries.
+
+    Pass `ALL_PLATFORMS` after a full reload. Pending platforms accumulate until
+    `clear_changed_platforms` is called.
+    """
+    ensure_metadata_table(conn)
+    if platforms == ALL_PLATFORMS:
+        write_metadata(conn, CHANGED_PLATFORMS_KEY, json.dumps(ALL_PLATFORMS))
+        return
+    raw = conn.execute(
+        text(f"SELECT value FROM {METADATA_TABLE} WHERE key = :key"), {"key": CHANGED_PLATFORMS_KEY}
+    ).scalar()
+    pending = json.loads(raw) if raw else []
+    if pending == ALL_PLATFORMS:
+        return
+    write_metadata(conn, CHANGED_PLATFORMS_KEY, json.dumps(sorted(set(pending) | set(platforms))))
+
+
+def read_changed_platforms(engine):
+    """Returns the pending changed platforms: a list, or `ALL_PLATFORMS`."""
+    raw = read_metadata(engine, CHANGED_PLATFORMS_KEY)
+    return json.loads(raw) if raw else []
+
+
+def clear_changed_platforms(conn, platforms, data_version: str):
+    """Removes the platforms a populate run refreshed (a list, or `ALL_PLATFORMS`) from the pending set.
+
+    `data_version` is the version read before the run read `platforms`. If a
+    load has bumped it since, the floats that load marked may have been read
+    before they changed, so everything stays pending for the next run.
+    """
+    ensure_metadata_table(conn)
+    # Locks the version row, so a load can't commit between this check and the write
+    current_version = conn.execute(
+        text(f"SELECT value FROM {METADATA_TABLE} WHERE key = :key FOR UPDATE"), {"key": DATA_VERSION_KEY}
+    ).scalar()
+    if (current_version or "0") != data_version:
+        return
+    raw = conn.execute(
+        text(f"SELECT value FROM {METADATA_TABLE} WHERE key = :key"), {"key": CHANGED_PLATFORMS_KEY}
+    ).scalar()
+    pending = json.loads(raw) if raw else []
+    if platforms == ALL_PLATFORMS:
+        remaining = []
+    elif pending == ALL_PLATFORMS:
+        remaining = ALL_PLATFORMS
+    else:
+        remaining = sorted(set(pending) - set(platforms))
+    write_metadata(conn, CHANGED_PLATFORMS_KEY, json.dumps(remaining))
+
+
+class DataVersionWatcher:
+    """Polls the data version at most every `interval` seconds and fires callbacks when it changes."""
+
+    def __init__(self, engine, interval: float = 30.0, read_version=None):
+        self.engine = engine
+        self.interval = interval
+        # Backends without the metadata table pass their own `read_version()`
+        self.read_version = read_version or (lambda: read_metadata(self.engine, DATA_VERSION_KEY, default="0"))
+        self.version = None
+        self._checked_at = 0.0
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def on_change(self, callback):
+        """Registers `callback(new_version)` to run whenever the data version changes."""
+        self._callbacks.append(callback)
+
+    def check(self, force: bool = False) -> str:
+        """Returns the current data version, re-reading it if the poll interval has passed."""
+        with self._lock:
+            if not force and self.version is not None and time.monotonic() - self._checked_at < self.interval:
+                return self.version
+            new_version = self.read_version()
+            self._checked_at = time.monotonic()
+            changed = self.version is not None and new_version != self.version
+            self.version = new_version
+        if changed:
+            for callback in self._callbacks:
+                callback(new_version)
+        return new_version
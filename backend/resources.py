@@ -0,0 +1,104 @@
+# resources.py
+
+"""Lazily loaded heavy resources (embedding model, vector store) with readiness reporting."""
+
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class LazyResource:
+    """Loads a resource once, on first use, and remembers how that went.
+
+    `get()` is thread-safe and returns None if loading failed, so callers can
+    degrade gracefully the same way they did when loading happened at import.
+    """
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._state = "cold"
+        self._error = None
+        self._load_seconds = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._state == "ready"
+
+    def get(self):
+        if self._state in ("ready", "failed"):
+            return self._value
+        with self._lock:
+            if self._state == "cold":
+                self._state = "loading"
+                start = time.perf_counter()
+                try:
+                    self._value = self._loader()
+                    self._state = "ready"
+                    print(f"✅ {self.name} loaded in {time.perf_counter() - start:.2f}s.")
+                except Exception as e:
+                    self._state = "failed"
+                    self._error = str(e)
+                    print(f"❌ ERROR: Could not load {self.name}. Error: {e}")
+                self._load_seconds = time.perf_counter() - start
+        return self._value
+
+    def status(self) -> dict:
+        return {"state": self._state, "load_seconds": self._load_seconds, "error": self._error}
+
+
+def load_sentence_transformer(model_name: str, backend: str = "torch", onnx_file: str = None):
+    """Loads a SentenceTransformer, optionally on the ONNX Runtime CPU backend.
+
+    `onnx_file` picks a specific (e.g. quantized) export from the model repo,
+    such as "onnx/model_qint8_avx512_vnni.onnx".
+    """
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        model_kwargs = {"file_name": onnx_file} if onnx_file else None
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs)
+    return SentenceTransformer(model_name)
+
+
+class RemoteEmbeddingModel:
+    """Drop-in for `SentenceTransformer.encode` backed by the shared embedding service.
+
+    Lets every API worker use one model process instead of loading its own copy.
+    The HTTP client is created on first use in each process, so workers forked
+    after a `gunicorn --preload` load don't share the master's connection pool.
+    """
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        import httpx
+
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._client = None
+        self._client_pid = None
+        self._lock = threading.Lock()
+        # Fail fast at load time (and mark the resource as failed) if the service is down.
+        # A one-off request, so no pooled connection is left behind for forked workers.
+        httpx.get(f"{self.url}/health", timeout=timeout).raise_for_status()
+
+    def _http(self):
+        pid = os.getpid()
+        if self._client_pid != pid:
+            import httpx
+
+            with self._lock:
+                if self._client_pid != pid:
+                    self._client = httpx.Client(timeout=self.timeout)
+                    self._client_pid = pid
+        return self._client
+
+    def encode(self, sentences, **kwargs):
+        single = isinstance(sentences, str)
+        response = self._http().post(f"{self.url}/encode", json={"texts": [sentences] if single else list(sentences)})
+        response.raise_for_status()
+        embeddings = np.asarray(response.json()["embeddings"], dtype=np.float32)
+        return embeddings[0] if single else embeddings
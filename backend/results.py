@@ -0,0 +1,256 @@
+# results.py
+
+"""Server-side handling of large query results.
+
+The API keeps full results in a ResultStore under a result ID and sends only the
+first page, plus a cursor for paging through the rest. The LLM gets a
+statistical digest of the result instead of the whole table, and the map and
+profile chart get bounded views:
+  - spatial_bins       : averages points that share a lat/lon grid cell, so a map draws at most ~max_points markers
+  - profile_downsample : LTTB-downsamples a profile (per variable) while keeping its shape
+
+A result that is a single, aliased aggregate value (e.g. `AVG(temperature) AS
+average_temperature`) can be summarized from a template (scalar_summary)
+without calling the LLM.
+"""
+
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+PROFILE_VARIABLES = ("temperature", "salinity")
+UNITS = {"temperature": "°C", "salinity": "PSU", "pressure": "dbar", "latitude": "°", "longitude": "°"}
+# First word of an aggregate alias -> how the sentence names it. "total"/"count" aliases of a
+# plural noun ("total_floats") are counts, so they read "number of ...".
+AGGREGATE_WORDS = {
+    "average": "average", "avg": "average", "mean": "average",
+    "maximum": "maximum", "max": "maximum", "highest": "highest",
+    "minimum": "minimum", "min": "minimum", "lowest": "lowest",
+    "sum": "total", "total": "total",
+    "count": "number of", "number": "number of", "num": "number of",
+}
+_ALIAS = re.compile(r"[a-z][a-z0-9]*(?:_[a-z0-9]+)+")
+
+
+class ResultStore:
+    """Holds query results by ID, bounded by total memory and evicting least-recently-used first."""
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024, ttl_seconds: float = 1800):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # result id -> (df, size, stored at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, df: pd.DataFrame, result_id: str = None) -> str:
+        """Stores `df` and returns its ID. Passing an existing ID re-stores a result that was evicted."""
+        result_id = result_id or uuid.uuid4().hex
+        size = int(df.memory_usage(index=False, deep=True).sum())
+        with self._lock:
+            if result_id in self._entries:
+                self._bytes -= self._entries.pop(result_id)[1]
+            self._entries[result_id] = (df, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+        return result_id
+
+    def get(self, result_id: str):
+        """Returns the stored DataFrame, or None if it expired or was evicted."""
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+                self._bytes -= self._entries.pop(result_id)[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(result_id)
+            self.hits += 1
+            return entry[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def page(df: pd.DataFrame, cursor: str = None, limit: int = 1000):
+    """Returns (rows, next cursor or None). The cursor is the offset of the next row, as an opaque string."""
+    try:
+        offset = max(int(cursor), 0) if cursor else 0
+    except ValueError:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    end = offset + limit
+    next_cursor = str(end) if end < len(df) else None
+    return df.iloc[offset:end], next_cursor
+
+
+def digest(df: pd.DataFrame, sample_rows: int = 20, full_rows: int = 50) -> str:
+    """Describes a result for the LLM: small results verbatim, large ones as stats plus a sample."""
+    if len(df) <= full_rows:
+        return df.to_markdown(index=False)
+
+    parts = [f"{len(df)} rows. Columns: " + ", ".join(f"{c} ({t})" for c, t in df.dtypes.astype(str).items())]
+    numeric = df.select_dtypes(include="number")
+    if not numeric.empty:
+        parts.append("Numeric columns:\n" + numeric.describe().T.to_markdown())
+    others = df.drop(columns=numeric.columns)
+    for column in others.columns:
+        series = others[column]
+        if pd.api.types.is_datetime64_any_dtype(series.dtype):
+            parts.append(f"{column}: {series.min()} to {series.max()}")
+        else:
+            top = series.value_counts().head(5)
+            parts.append(f"{column}: {series.nunique()} distinct; most common " + ", ".join(f"{v} ({n})" for v, n in top.items()))
+    sample = df.sample(n=min(sample_rows, len(df)), random_state=0).sort_index()
+    parts.append(f"Sample of {len(sample)} rows:\n" + sample.to_markdown(index=False))
+    return "\n\n".join(parts)
+
+
+def spatial_bins(df: pd.DataFrame, max_points: int = 2000):
+    """Averages points per lat/lon grid cell so at most max_points remain. None if the result has no locations."""
+    if not {"latitude", "longitude"} <= set(df.columns):
+        return None
+    points = df.dropna(subset=["latitude", "longitude"])
+    if len(points) <= max_points:
+        return points
+
+    # Start with cells sized so the grid over the data's extent has about max_points cells, but
+    # never smaller than the long side / max_points (a thin band would otherwise get far more),
+    # then coarsen until no more than max_points cells are occupied
+    lat = points["latitude"].to_numpy(dtype=np.float64)
+    lon = points["longitude"].to_numpy(dtype=np.float64)
+    lat, lon = lat - lat.min(), lon - lon.min()
+    lat_span, lon_span = max(lat.max(), 1e-6), max(lon.max(), 1e-6)
+    cell = max(np.sqrt(lat_span * lon_span / max_points), max(lat_span, lon_span) / max_points)
+    while True:
+        keys = [np.floor(lat / cell).astype(np.int64), np.floor(lon / cell).astype(np.int64)]
+        if len(np.unique(np.column_stack(keys), axis=0)) <= max_points:
+            break
+        cell *= 1.1
+    numeric = points.select_dtypes(include="number")
+    grouped = numeric.groupby(keys)
+    binned = grouped.mean()
+    binned["count"] = grouped.size()
+    if "platform_number" in points.columns:
+        floats = points["platform_number"].groupby(keys)
+        binned["platform_number"] = floats.first().where(floats.nunique() == 1)
+    return binned.reset_index(drop=True)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of `threshold` points that preserve the curve's shape."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        next_end = max(next_end, next_start + 1)
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+    return selected
+
+
+def profile_downsample(df: pd.DataFrame, max_points: int = 500):
+    """Downsamples a pressure profile for charting. None if the result isn't a profile."""
+    variables = [v for v in PROFILE_VARIABLES if v in df.columns]
+    if "pressure" not in df.columns or not variables:
+        return None
+    profile = df.sort_values("pressure").dropna(subset=["pressure"]).reset_index(drop=True)
+    if len(profile) <= max_points:
+        return profile
+
+    # Keep the union of the points LTTB picks for each variable, so both lines keep their shape.
+    # LTTB needs at least 3 points (below that it returns everything).
+    x = profile["pressure"].to_numpy(dtype=np.float64)
+    threshold = max(max_points // len(variables), 3)
+    keep = set()
+    for variable in variables:
+        y = profile[variable].to_numpy(dtype=np.float64)
+        valid = np.flatnonzero(~np.isnan(y))
+        picked = lttb(x[valid], y[valid], threshold)
+        keep.update(valid[picked].tolist())
+    keep = np.array(sorted(keep))
+    if len(keep) > max_points:
+        # Small budgets: stride through the union, keeping both ends of the profile
+        keep = keep[np.unique(np.linspace(0, len(keep) - 1, max_points).round().astype(np.int64))]
+    return profile.iloc[keep].reset_index(drop=True)
+
+
+def format_number(value: float) -> str:
+    """Up to three decimals for values of 1 or more; smaller ones keep four significant digits, written out in full."""
+    if value == 0:
+        return "0"
+    if abs(value) >= 1:
+        return f"{value:,.3f}".rstrip("0").rstrip(".")
+    return format(Decimal(f"{value:.4g}"), "f")
+
+
+def aggregate_label(column: str):
+    """Names an aggregate alias for a sentence ("total_floats" -> "number of floats"), or None if it isn't one.
+
+    Unaliased aggregates ("count", "count_star()") and plain columns such as
+    platform_number don't qualify.
+    """
+    if not _ALIAS.fullmatch(column):
+        return None
+    first, rest = column.split("_", 1)
+    kind = AGGREGATE_WORDS.get(first)
+    if kind is None:
+        return None
+    words = rest.replace("_", " ").removeprefix("of ")
+    if kind == "total" and words.endswith("s"):
+        kind = "number of"
+    return f"{kind} {words}"
+
+
+def scalar_summary(df: pd.DataFrame):
+    """Formats a 1x1 aliased aggregate (e.g. `AVG(temperature) AS average_temperature`) as a sentence, or returns None."""
+    if df.shape != (1, 1):
+        return None
+    column = str(df.columns[0])
+    value = df.iat[0, 0]
+    label = aggregate_label(column)
+    if label is None:
+        return None
+    if pd.isna(value):
+        return f"The query returned no value for {label}."
+    if isinstance(value, (bool, np.bool_)):
+        text = "yes" if value else "no"
+    elif isinstance(value, (int, np.integer)):
+        text = f"{value:,}"
+    elif isinstance(value, (float, np.floating)):
+        text = format_number(float(value))
+    elif isinstance(value, pd.Timestamp):
+        text = value.strftime("%Y-%m-%d %H:%M") if (value.hour, value.minute) != (0, 0) else value.strftime("%Y-%m-%d")
+    else:
+        text = str(value)
+    unit = "" if label.startswith("number of") else next((u for name, u in UNITS.items() if name in column), "")
+    if unit and isinstance(value, (float, np.floating)):
+        text += unit if unit == "°" else f" {unit}"
+    return f"The {label} is {text}."
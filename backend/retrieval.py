@@ -0,0 +1,164 @@
+# retrieval.py
+
+"""Vector-store retrieval with metadata pre-filters derived from the question.
+
+Both Chroma collections carry numeric metadata (dates as YYYYMMDD integers,
+latitude/longitude), so date ranges, regions and platform numbers mentioned
+in a question become `where` filters that narrow the ANN search up front.
+"""
+
+import re
+
+FLOAT_COLLECTION = "argo_float_summaries"
+CYCLE_COLLECTION = "argo_cycle_summaries"
+
+MONTHS = {
+    name: i + 1
+    for i, name in enumerate(
+        ["january", "february", "march", "april", "may", "june",
+         "july", "august", "september", "october", "november", "december"]
+    )
+}
+_YEAR = re.compile(r"\b(19[89]\d|20\d\d)\b")
+_MONTH_YEAR = re.compile(r"\b(" + "|".join(MONTHS) + r")\s+(19[89]\d|20\d\d)\b", re.IGNORECASE)
+# WMO IDs: 5 digits for older floats (e.g. 53555), 7 for newer ones. Only numbers right after "float",
+# "platform" or "WMO" count ("floats 53546 and 5905233"), so "more than 20000 measurements" is not an ID.
+_PLATFORM_ID = re.compile(r"\b\d{5,7}\b")
+_PLATFORM = re.compile(
+    r"\b(?:floats?|platforms?|wmo)(?:\s+(?:numbers?|ids?|no\.?))?\s*#?\s*"
+    r"(\d{5,7}(?:\s*(?:,|and|or|&)\s*#?\d{5,7})*)\b"
+)
+
+# Regions we can recognize, as (min latitude, max latitude). 'equator' matches the SQL prompt's rule.
+# Matched as whole words, longest name first, so "antarctic" is never read as "arctic".
+REGIONS = {
+    "equator": (-5.0, 5.0),
+    "equatorial": (-5.0, 5.0),
+    "tropics": (-23.5, 23.5),
+    "tropical": (-23.5, 23.5),
+    "southern hemisphere": (-90.0, 0.0),
+    "northern hemisphere": (0.0, 90.0),
+    "arctic": (66.5, 90.0),
+    "antarctic": (-90.0, -60.0),
+    "southern ocean": (-90.0, -60.0),
+}
+_REGION_PATTERNS = [
+    (re.compile(rf"\b{re.escape(name)}\b"), bounds)
+    for name, bounds in sorted(REGIONS.items(), key=lambda item: -len(item[0]))
+]
+
+
+def date_int(year: int, month: int = 1, day: int = 1) -> int:
+    return year * 10000 + month * 100 + day
+
+
+def constraints_from_question(question: str) -> dict:
+    """Extracts date, latitude and platform constraints mentioned in a question.
+
+    Returns a dict with any of `date` ((start, end) as YYYYMMDD ints), `lat`
+    ((min, max)) and `platforms` (list of platform numbers).
+    """
+    text = question.lower()
+    constraints = {}
+
+    platforms = [p for mention in _PLATFORM.findall(text) for p in _PLATFORM_ID.findall(mention)]
+    if platforms:
+        constraints["platforms"] = sorted(set(platforms))
+
+    month_years = _MONTH_YEAR.findall(text)
+    if month_years:
+        months = [(int(y), MONTHS[m.lower()]) for m, y in month_years]
+        (y0, m0), (y1, m1) = min(months), max(months)
+        constraints["date"] = (date_int(y0, m0, 1), date_int(y1, m1, 31))
+    else:
+        # Platform numbers can contain four-digit runs that look like years
+        years = [int(y) for y in _YEAR.findall(_PLATFORM.sub(" ", text))]
+        if years:
+            constraints["date"] = (date_int(min(years), 1, 1), date_int(max(years), 12, 31))
+
+    for pattern, bounds in _REGION_PATTERNS:
+        if pattern.search(text):
+            constraints["lat"] = bounds
+            break
+
+    return constraints
+
+
+def _combine(clauses: list):
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def cycle_where(constraints: dict):
+    """Chroma `where` filter for the per-cycle collection (one point per document)."""
+    clauses = []
+    if "platforms" in constraints:
+        clauses.append({"platform_number": {"$in": constraints["platforms"]}})
+    if "date" in constraints:
+        start, end = constraints["date"]
+        clauses += [{"date": {"$gte": start}}, {"date": {"$lte": end}}]
+    if "lat" in constraints:
+        low, high = constraints["lat"]
+        clauses += [{"latitude": {"$gte": low}}, {"latitude": {"$lte": high}}]
+    return _combine(clauses)
+
+
+def float_where(constraints: dict):
+    """Chroma `where` filter for the per-float collection: keep floats whose ranges overlap the constraints."""
+    clauses = []
+    if "platforms" in constraints:
+        clauses.append({"platform_number": {"$in": constraints["platforms"]}})
+    if "date" in constraints:
+        start, end = constraints["date"]
+        clauses += [{"last_seen": {"$gte": start}}, {"first_seen": {"$lte": end}}]
+    if "lat" in constraints:
+        low, high = constraints["lat"]
+        clauses += [{"max_lat": {"$gte": low}}, {"min_lat": {"$lte": high}}]
+    return _combine(clauses)
+
+
+WHERE_BUILDERS = {FLOAT_COLLECTION: float_where, CYCLE_COLLECTION: cycle_where}
+
+# Constraints dropped, in this order, when a filter matches nothing: the most selective one first
+RELAX_ORDER = ("platforms", "date", "lat")
+
+
+def relaxations(constraints: dict) -> list:
+    """`constraints`, then copies with one more constraint dropped each time, ending with no constraints."""
+    steps = [dict(constraints)]
+    for name in RELAX_ORDER:
+        if name in steps[-1]:
+            steps.append({key: value for key, value in steps[-1].items() if key != name})
+    return steps
+
+
+def query_collection(collection, query_embedding, n_results: int, wheres: list) -> list:
+    """Returns the top documents for the first `where` filter in `wheres` that matches anything.
+
+    `wheres` goes from the strictest filter to the loosest (None searches
+    unfiltered), so a constraint that matches nothing is dropped without losing
+    the others. This also covers collections built before the numeric metadata
+    existed (their documents never match a filter). Chroma errors propagate,
+    so a broken collection fails retrieval instead of looking like no context.
+    """
+    documents = []
+    for where in wheres:
+        if where is None:
+            results = collection.query(query_embeddings=[query_embedding], n_results=n_results)
+        else:
+            results = collection.query(query_embeddings=[query_embedding], n_results=n_results, where=where)
+        documents = results["documents"][0]
+        if documents:
+            break
+    return documents
+
+
+def retrieve(collections: dict, question: str, query_embedding, n_results: int = 3) -> list:
+    """Searches every available collection with the filters derived from `question`."""
+    steps = relaxations(constraints_from_question(question))
+    documents = []
+    for name, collection in collections.items():
+        wheres = [WHERE_BUILDERS[name](constraints) for constraints in steps]
+        documents += query_collection(collection, query_embedding, n_results, wheres)
+    return documents
@@ -0,0 +1,221 @@
+# tracing.py
+
+"""Per-stage tracing for the /ask pipeline.
+
+Each request gets a Trace, held in a context variable, so pipeline code can
+time itself with `with stage("query"):` without passing the trace around.
+Stages feed Prometheus histograms (served on /metrics) and the trace records
+row counts, a hash of the normalized SQL, the cache outcome and, on failure,
+the failing stage and error class. Requests slower than a threshold can be
+appended to a JSON-lines slow-query log.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import Counter, Histogram
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from backend.cache import normalize_sql
+from backend.llm import CANCELLATIONS, error_status
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LLM_STAGES = ("sql_generation", "summary")
+
+STAGE_SECONDS = Histogram(
+    "oceangpt_stage_seconds", "Time spent in each /ask pipeline stage.", ["stage", "outcome"], buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "oceangpt_request_seconds", "End-to-end request latency.", ["endpoint", "outcome"], buckets=LATENCY_BUCKETS
+)
+RESULT_ROWS = Histogram(
+    "oceangpt_result_rows", "Rows returned by the generated SQL.", buckets=(0, 1, 10, 100, 1000, 10000, 100000)
+)
+ERRORS = Counter("oceangpt_errors_total", "Pipeline failures by stage and error class.", ["stage", "error_class"])
+ANSWER_CACHE = Counter("oceangpt_answer_cache_total", "Answer cache outcomes.", ["outcome"])
+
+slow_query_log = logging.getLogger("oceangpt.slow_queries")
+_current = ContextVar("oceangpt_trace", default=None)
+
+
+def sql_hash(sql: str) -> str:
+    """A short, stable ID for a query shape (whitespace, case and comments don't matter)."""
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()[:12]
+
+
+def configure_slow_query_log(path: str = None, threshold_seconds: float = 5.0):
+    """Enables the slow-query log: requests slower than `threshold_seconds` are appended to `path` as JSON lines."""
+    Trace.slow_threshold = threshold_seconds if path else None
+    if path:
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        slow_query_log.addHandler(handler)
+        slow_query_log.setLevel(logging.INFO)
+        slow_query_log.propagate = False
+
+
+class Trace:
+    """Timings and attributes for one request."""
+
+    slow_threshold = None
+
+    def __init__(self, endpoint: str, question: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.endpoint = endpoint
+        self.question = question
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.attrs = {}
+        self.error_stage = None
+        self.error_class = None
+        self.cancelled_stage = None
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield self
+        except CANCELLATIONS:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            if self.cancelled_stage is None:
+                self.cancelled_stage = name
+            STAGE_SECONDS.labels(name, "cancelled").observe(elapsed)
+            raise
+        except BaseException as e:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            if self.error_stage is None:
+                self.error_stage, self.error_class = name, type(e).__name__
+                ERRORS.labels(name, self.error_class).inc()
+            STAGE_SECONDS.labels(name, "error").observe(elapsed)
+            raise
+        elapsed = time.perf_counter() - start
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed
+        STAGE_SECONDS.labels(name, "ok").observe(elapsed)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+        if "sql" in attrs:
+            self.attrs["sql_hash"] = sql_hash(attrs["sql"])
+        if "rows" in attrs:
+            RESULT_ROWS.observe(attrs["rows"])
+        if "cached" in attrs:
+            ANSWER_CACHE.labels(attrs["cached"] or "miss").inc()
+
+    def finish(self) -> float:
+        total = time.perf_counter() - self.start
+        outcome = "error" if self.error_class else "cancelled" if self.cancelled_stage else "ok"
+        REQUEST_SECONDS.labels(self.endpoint, outcome).observe(total)
+        if self.slow_threshold is not None and total >= self.slow_threshold:
+            slow_query_log.info(json.dumps(self.to_dict(total), default=str))
+        return total
+
+    def to_dict(self, total: float = None) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "endpoint": self.endpoint,
+            "question": self.question,
+            "total_seconds": total if total is not None else time.perf_counter() - self.start,
+            "stages": self.stages,
+            "error_stage": self.error_stage,
+            "error_class": self.error_class,
+            "cancelled_stage": self.cancelled_stage,
+            **self.attrs,
+        }
+
+
+def start_trace(endpoint: str, question: str) -> Trace:
+    trace = Trace(endpoint, question)
+    _current.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """Times a stage of the current request (or just the histogram, outside a request)."""
+    trace = _current.get()
+    if trace is not None:
+        with trace.stage(name):
+            yield
+        return
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except CANCELLATIONS:
+        outcome = "cancelled"
+        raise
+    finally:
+        STAGE_SECONDS.labels(name, outcome).observe(time.perf_counter() - start)
+
+
+def annotate(**attrs):
+    """Adds attributes to the current request's trace, if there is one."""
+    trace = _current.get()
+    if trace is not None:
+        trace.set(**attrs)
+
+
+def _first_line(e: Exception) -> str:
+    message = str(getattr(e, "orig", None) or e).strip()
+    return message.splitlines()[0] if message else type(e).__name__
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        return None
+    return duckdb
+
+
+def classify_error(e: Exception, stage_name: str = None) -> tuple:
+    """Maps a pipeline failure to (HTTP status, error code, message) using its type and the stage it came from."""
+    if isinstance(e, PoolTimeoutError):
+        return 503, "db_busy", "All database connections are busy. Please try again shortly."
+    if isinstance(e, asyncio.TimeoutError):
+        if stage_name == "query":
+            return 504, "query_timeout", "The database query took too long."
+        if stage_name in LLM_STAGES:
+            return 504, "llm_timeout", "The language model took too long to respond."
+        return 504, "timeout", "The request timed out while waiting for the LLM or the database."
+
+    if isinstance(e, sa_exc.DBAPIError):
+        if isinstance(e, (sa_exc.ProgrammingError, sa_exc.DataError)):
+            return 422, "invalid_sql", f"The generated SQL query failed: {_first_line(e)}"
+        if isinstance(e, sa_exc.OperationalError):
+            if "statement timeout" in _first_line(e):
+                return 504, "query_timeout", "The database query took too long."
+            return 503, "db_unavailable", "The database is unavailable. Please try again shortly."
+        return 500, "db_error", f"The database returned an error: {_first_line(e)}"
+
+    duckdb = _duckdb()
+    if duckdb is not None and isinstance(e, duckdb.Error):
+        if isinstance(e, (duckdb.ParserException, duckdb.BinderException, duckdb.CatalogException,
+                          duckdb.ConversionException, duckdb.InvalidInputException,
+                          duckdb.NotImplementedException)):
+            return 422, "invalid_sql", f"The generated SQL query failed: {_first_line(e)}"
+        return 500, "db_error", f"The database returned an error: {_first_line(e)}"
+
+    module = type(e).__module__ or ""
+    if module.startswith(("google", "langchain_google_genai")) or stage_name in LLM_STAGES:
+        if error_status(e) == 429:
+            return 429, "llm_rate_limited", "The language model is rate limited. Please try again shortly."
+        return 502, "llm_error", f"The language model request failed: {_first_line(e)}"
+
+    if stage_name in ("embedding", "retrieval"):
+        return 503, f"{stage_name}_error", f"The {stage_name} step failed: {_first_line(e)}"
+    return 500, "internal_error", f"Internal error{f' during {stage_name}' if stage_name else ''}: {type(e).__name__}"
@@ -0,0 +1,84 @@
+# fake_llm.py
+
+"""A local stand-in for Gemini so benchmarks measure our pipeline, not the network."""
+
+import asyncio
+import re
+import time
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+DEFAULT_SQL = "SELECT platform_number, latitude, longitude FROM argo_data ORDER BY latitude ASC LIMIT 1"
+DEFAULT_SUMMARY = "The southernmost measurement in the dataset was recorded by the float shown above."
+
+
+def _is_sql_prompt(prompt_value) -> bool:
+    if isinstance(prompt_value, str):
+        return "SQL query writer" in prompt_value
+    return any("SQL query writer" in str(m.content) for m in prompt_value.to_messages())
+
+
+def make_fake_llm(latency: float = 0.5, sql: str = DEFAULT_SQL, summary: str = DEFAULT_SUMMARY):
+    """Returns a runnable that answers the SQL prompt with `sql` and anything else with `summary`.
+
+    Each call waits `latency` seconds: `time.sleep` on the sync path and
+    `asyncio.sleep` on the async path, like a real HTTP client would.
+    """
+    def respond(prompt_value):
+        time.sleep(latency)
+        return AIMessage(content=sql if _is_sql_prompt(prompt_value) else summary)
+
+    async def arespond(prompt_value):
+        await asyncio.sleep(latency)
+        return AIMessage(content=sql if _is_sql_prompt(prompt_value) else summary)
+
+    return RunnableLambda(respond, afunc=arespond)
+
+
+def _prompt_text(prompt_value) -> str:
+    if isinstance(prompt_value, str):
+        return prompt_value
+    return "\n".join(str(m.content) for m in prompt_value.to_messages())
+
+
+def _question(prompt_value) -> str:
+    """The user's question: the human message of the SQL prompt, or the quoted question in the summary prompt."""
+    if _is_sql_prompt(prompt_value):
+        if isinstance(prompt_value, str):
+            return prompt_value.strip().splitlines()[-1]
+        return str(prompt_value.to_messages()[-1].content)
+    match = re.search(r"The user asked: '(.*?)'\. The following", _prompt_text(prompt_value), re.S)
+    return match.group(1) if match else ""
+
+
+def make_recorded_llm(recordings: dict, latency: float = 0.0, sql: str = DEFAULT_SQL, summary: str = DEFAULT_SUMMARY):
+    """Returns a runnable that replays recorded answers instead of calling Gemini.
+
+    `recordings` maps a question to {"sql": ..., "summary": ...}; unknown
+    questions get `sql`/`summary`. Responses carry rough token counts
+    (characters / 4) in `usage_metadata`, so the LLM client's token metrics
+    have something to count.
+    """
+    def respond_now(prompt_value):
+        recorded = recordings.get(_question(prompt_value).strip(), {})
+        if _is_sql_prompt(prompt_value):
+            content = recorded.get("sql", sql)
+        else:
+            content = recorded.get("summary", summary)
+        input_tokens, output_tokens = len(_prompt_text(prompt_value)) // 4, len(content) // 4
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+
+    def respond(prompt_value):
+        time.sleep(latency)
+        return respond_now(prompt_value)
+
+    async def arespond(prompt_value):
+        await asyncio.sleep(latency)
+        return respond_now(prompt_value)
+
+    return RunnableLambda(respond, afunc=arespond)
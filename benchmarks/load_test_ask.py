@@ -0,0 +1,198 @@
+# load_test_ask.py
+
+"""
+Load test for the /ask endpoint with Gemini replaced by a local fake LLM.
+
+Runs the same workload against two routes served by one uvicorn instance:
+  - /ask_blocking : a replica of the original handler: sync `def` in the threadpool, a
+                    chain built and `invoke`d per call with the original prompts, the
+                    float-summary collection only, `pd.read_sql` on an unclosed connection
+                    from its own default engine, and per-cell JSON conversion
+  - /ask          : the async pipeline (`ainvoke`, bounded embedding/SQL executors)
+
+PostgreSQL and the Chroma collection must be available, exactly as for the API itself.
+
+Requests cycle through --questions. The fake LLM writes the same SQL for every
+question, so the answer, result and embedding caches are turned off (unless
+--caches is passed); otherwise /ask would be measuring cache hits rather than
+the pipeline.
+
+Usage (from the repository root):
+    python benchmarks/load_test_ask.py --requests 200 --concurrency 50 --llm-latency 0.5
+    python benchmarks/load_test_ask.py --questions "Which float was furthest south?" "How many floats are there?"
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+import httpx
+import numpy as np
+import pandas as pd
+import uvicorn
+from langchain_core.prompts import ChatPromptTemplate
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_llm import make_fake_llm  # noqa: E402
+from backend import api  # noqa: E402
+
+
+# The original prompts, verbatim
+BASELINE_SQL_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system",
+         "You are an expert PostgreSQL query writer. Your task is to convert a user's question into a single, syntactically correct SQL query. "
+         "Use the provided **retrieved context** and **database context** to help you write the most accurate query.\n\n"
+         "--- RETRIEVED CONTEXT (from vector search) ---\n{context}\n--------------------------------------------\n\n"
+         "Follow these rules precisely:\n"
+         "1. **For 'highest'/'lowest'/'latest' records (e.g., 'furthest south'), ALWAYS use `ORDER BY` and `LIMIT 1`.** DO NOT use `GROUP BY`. "
+         "   - 'Furthest south' means `ORDER BY latitude ASC LIMIT 1`. 'Furthest west' means `ORDER BY longitude ASC LIMIT 1`.\n"
+         "2. **For aggregates on a 'top N' subset, ALWAYS use a subquery.**\n"
+         "3. **ALWAYS use descriptive aliases for aggregate columns** (e.g., `AVG(temperature) AS average_temperature`).\n"
+         "4. **Interpret geographical terms**: 'equator' means `latitude BETWEEN -5 AND 5`.\n"
+         "5. **Always include columns mentioned by the user.** If asked 'Which float...', you must select `platform_number`.\n"
+         "6. Only output the SQL query. Nothing else.\n\n"
+         "--- DATABASE CONTEXT ---\n{db_context}\n-------------------------"
+        ),
+        ("human", "{question}")
+    ]
+)
+BASELINE_SUMMARY_PROMPT = ChatPromptTemplate.from_template(
+    "You are a helpful oceanographic data analyst. The user asked: '{question}'. "
+    "The following data was retrieved from the database:\n{results}\n\n"
+    "Please provide a concise, natural language summary of the findings."
+)
+
+
+def install_blocking_route():
+    """Registers a replica of the original synchronous /ask handler for comparison."""
+    # The original API created one default engine and never used a pool size, timeout or row cap
+    baseline_engine = create_engine(api.engine_string)
+    db_context = api.get_db_context()  # the original computed this once, at import
+
+    def run_query(query_string):
+        return pd.read_sql(text(query_string), baseline_engine.connect())
+
+    def find_relevant_context(question):
+        collection = (api.collection_resource.get() or {}).get(api.FLOAT_COLLECTION)
+        embedding_model = api.embedding_model_resource.get()
+        if not collection or not embedding_model:
+            return "Vector database not available."
+        query_embedding = embedding_model.encode(question).tolist()
+        results = collection.query(query_embeddings=[query_embedding], n_results=3)
+        return "\n---\n".join(results['documents'][0])
+
+    @api.app.post("/ask_blocking")
+    def ask_blocking(request: api.QueryRequest):
+        context = find_relevant_context(request.question)
+        # A new chain per call, as the original created a new chat model per call
+        chain = BASELINE_SQL_PROMPT | api.get_llm()
+        response = chain.invoke({"question": request.question, "context": context, "db_context": db_context})
+        sql_query = response.content.strip().replace("```sql", "").replace("```", "")
+        results_df = run_query(sql_query)
+        if results_df.empty:
+            summary = "I couldn't find any data that matches your query. Please try asking in a different way."
+        else:
+            chain = BASELINE_SUMMARY_PROMPT | api.get_llm()
+            summary = chain.invoke({"question": request.question, "results": results_df.to_markdown(index=False)}).content
+
+        for col in results_df.select_dtypes(include=['datetime64[ns]']).columns:
+            results_df[col] = results_df[col].astype(str)
+        for col in results_df.columns:
+            if pd.api.types.is_numeric_dtype(results_df[col].dtype):
+                results_df[col] = results_df[col].apply(lambda x: float(x) if isinstance(x, np.number) else x)
+        return {"summary": summary, "data": results_df.to_dict(orient='records'), "sql_query": sql_query}
+
+
+DEFAULT_QUESTIONS = [
+    "Which float was furthest south?",
+    "What is the average temperature near the equator?",
+    "How many floats are in the dataset?",
+    "Which float recorded the deepest pressure?",
+    "Show the salinity profile of the most recent cycle.",
+]
+
+
+def disable_caches():
+    """Turns off the answer, result and embedding caches so every request runs the whole pipeline."""
+    api.answer_cache.max_entries = 0
+    api.result_cache.max_bytes = 0
+    api.question_encoder.cache_size = 0
+    api.answer_cache.invalidate()
+    api.result_cache.invalidate()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_load(url: str, total: int, concurrency: int, questions: list):
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=300) as client:
+        async def one(question):
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(url, json={"question": question})
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(questions[i % len(questions)]) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rps": total / elapsed,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /ask with a fake LLM.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per fake LLM call.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--questions", nargs="+", default=DEFAULT_QUESTIONS, help="Questions to cycle through.")
+    parser.add_argument("--caches", action="store_true", help="Keep the answer/result/embedding caches on.")
+    args = parser.parse_args()
+
+    fake_llm = make_fake_llm(latency=args.llm_latency)
+    api.get_llm = lambda: fake_llm
+    install_blocking_route()
+    if not args.caches:
+        disable_caches()
+
+    server = uvicorn.Server(uvicorn.Config(api.app, port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base = f"http://127.0.0.1:{args.port}"
+    print(f"{args.requests} requests over {len(args.questions)} questions, concurrency {args.concurrency}, "
+          f"fake LLM latency {args.llm_latency}s, caches {'on' if args.caches else 'off'}")
+    print(f"{'route':<15}{'p50 (ms)':>12}{'p99 (ms)':>12}{'req/s':>10}{'errors':>8}")
+    for route in ("/ask_blocking", "/ask"):
+        stats = asyncio.run(run_load(base + route, args.requests, args.concurrency, args.questions))
+        print(f"{route:<15}{stats['p50_ms']:>12.1f}{stats['p99_ms']:>12.1f}{stats['rps']:>10.1f}{stats['errors']:>8}")
+
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
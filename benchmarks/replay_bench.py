@@ -0,0 +1,429 @@
+# replay_bench.py
+
+"""
+Replays a corpus of questions through the full /ask pipeline, offline and repeatably.
+
+Nothing leaves the machine:
+  - the LLM is replaced by recorded answers (fake_llm.make_recorded_llm), so
+    every run generates the same SQL. Use --live-llm to call Gemini instead
+  - the database is a DuckDB fixture built from argo_final_data.parquet with
+    load_to_duckdb.py, cached under benchmarks/.fixtures/ and rebuilt when the
+    parquet file changes
+  - with --fake-retrieval, the embedding model and Chroma are replaced by
+    hash-based question vectors and an empty context, for machines without them
+
+Requests go through the ASGI app in-process (httpx.ASGITransport), so routing,
+serialization and the caches are all included. For each --concurrency level the
+caches start cold and the corpus is replayed --repeat times. The report has:
+  - latency  : end-to-end distribution (p50/p90/p99/mean/max) and throughput
+  - stages   : per-stage distributions from the request traces (backend/tracing.py)
+  - cache    : answer-cache (exact/semantic/miss) and result-cache hit rates
+  - equivalence : for questions with a reference_sql, whether the SQL the pipeline
+                  ran returns the same rows as the stored reference
+  - result_endpoints : for each answer with more than --page-size rows, whether
+                       GET /results/{id} returns page 2 intact and every view loads
+  - map_bins : whether the map view stays within MAP_MAX_POINTS for square and
+               long, thin extents
+  - profile_points : whether the profile view stays within small and large point budgets
+
+Results are written as JSON; pass an earlier run to --compare to see the deltas.
+
+Usage (from the repository root):
+    python benchmarks/replay_bench.py --fake-retrieval --concurrency 1 4 16 --output replay.json
+    python benchmarks/replay_bench.py --fake-retrieval --compare replay.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_llm import make_recorded_llm  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(BENCH_DIR, "replay_corpus.jsonl")
+FIXTURE_DIR = os.path.join(BENCH_DIR, ".fixtures")
+
+
+def load_corpus(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_fixture(parquet: str, rebuild: bool = False) -> str:
+    """Returns a DuckDB fixture for `parquet`, building it if it's missing or older than the parquet file."""
+    from load_to_duckdb import build
+
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    fixture = os.path.join(FIXTURE_DIR, "argo.duckdb")
+    if rebuild or not os.path.exists(fixture) or os.path.getmtime(fixture) < os.path.getmtime(parquet):
+        build(parquet, fixture)
+    return fixture
+
+
+def load_api(fixture: str):
+    """Imports the API configured for the fixture. The config is read at import, so this runs after the env is set."""
+    os.environ["QUERY_BACKEND"] = "duckdb"
+    os.environ["DUCKDB_PATH"] = fixture
+    os.environ["STARTUP_MODE"] = "lazy"
+    from backend import api
+
+    return api
+
+
+def fake_embedding(question: str, dim: int = 384) -> np.ndarray:
+    """A deterministic unit vector per normalized question (identical questions match, paraphrases don't)."""
+    from backend.cache import normalize_question
+
+    seed = int.from_bytes(hashlib.sha1(normalize_question(question).encode()).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def install_fakes(api, corpus: list, args):
+    if not args.live_llm:
+        recordings = {item["question"].strip(): item for item in corpus}
+        fake_llm = make_recorded_llm(recordings, latency=args.llm_latency)
+        api.get_llm = lambda: fake_llm
+        api.llm_client.reset()
+
+    if args.fake_retrieval:
+        async def embed_question_async(question):
+            return fake_embedding(question)
+
+        async def find_relevant_context_async(question, query_embedding=None):
+            return ""
+
+        api.embed_question_async = embed_question_async
+        api.find_relevant_context_async = find_relevant_context_async
+
+
+def record_traces(api) -> list:
+    """Collects every request's Trace by wrapping `start_trace`."""
+    traces = []
+    start_trace = api.start_trace
+
+    def recording_start_trace(endpoint, question):
+        trace = start_trace(endpoint, question)
+        traces.append(trace)
+        return trace
+
+    api.start_trace = recording_start_trace
+    return traces
+
+
+def distribution(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pct(p):
+        return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))] * 1000
+
+    return {
+        "count": len(ordered),
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+async def replay(api, questions: list, concurrency: int) -> dict:
+    import httpx
+
+    latencies, statuses = [], {}
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=300) as client:
+        async def one(question):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/ask", json={"question": question})
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(q) for q in questions))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(questions),
+        "errors": sum(n for status, n in statuses.items() if status != 200),
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+        "elapsed_s": elapsed,
+        "throughput_rps": len(questions) / elapsed,
+        "latency": distribution(latencies),
+    }
+
+
+def summarize_traces(traces: list) -> tuple:
+    stages, answer_cache, result_cache, errors = {}, {}, {}, {}
+    for trace in traces:
+        for name, seconds in trace.stages.items():
+            stages.setdefault(name, []).append(seconds)
+        cached = trace.attrs.get("cached") or "miss"
+        answer_cache[cached] = answer_cache.get(cached, 0) + 1
+        if "result_cache" in trace.attrs:
+            outcome = trace.attrs["result_cache"]
+            result_cache[outcome] = result_cache.get(outcome, 0) + 1
+        if trace.error_class:
+            key = f"{trace.error_stage}:{trace.error_class}"
+            errors[key] = errors.get(key, 0) + 1
+
+    total = len(traces) or 1
+    lookups = sum(result_cache.values()) or 1
+    cache = {
+        "answer_cache": {**answer_cache, "hit_rate": (total - answer_cache.get("miss", 0)) / total},
+        "result_cache": {**result_cache, "hit_rate": result_cache.get("hit", 0) / lookups},
+    }
+    return {name: distribution(values) for name, values in sorted(stages.items())}, cache, errors
+
+
+def frames_equivalent(actual: pd.DataFrame, expected: pd.DataFrame, ordered: bool) -> tuple:
+    """Compares results by position (column names are aliases and may differ), with a float tolerance."""
+    if actual.shape != expected.shape:
+        return False, f"shape {actual.shape} != {expected.shape}"
+    a = actual.reset_index(drop=True).set_axis(range(actual.shape[1]), axis=1)
+    b = expected.reset_index(drop=True).set_axis(range(expected.shape[1]), axis=1)
+    if not ordered:
+        a = a.loc[a.astype(str).sort_values(list(a.columns)).index].reset_index(drop=True)
+        b = b.loc[b.astype(str).sort_values(list(b.columns)).index].reset_index(drop=True)
+    for column in a.columns:
+        left, right = a[column].to_numpy(), b[column].to_numpy()
+        if pd.api.types.is_numeric_dtype(a[column]) and pd.api.types.is_numeric_dtype(b[column]):
+            same = np.isclose(left.astype(float), right.astype(float), rtol=1e-5, equal_nan=True)
+        else:
+            same = pd.Series(left).astype(str).to_numpy() == pd.Series(right).astype(str).to_numpy()
+        if not same.all():
+            return False, f"column {column} differs at row {int(np.argmin(same))}"
+    return True, None
+
+
+def check_equivalence(api, corpus: list, traces: list) -> dict:
+    """Runs the SQL each question actually got (from its trace) and its reference_sql, and compares the rows."""
+    generated = {}
+    for trace in traces:
+        if "sql" in trace.attrs:
+            generated.setdefault(trace.question, trace.attrs["sql"])
+    report = {"checked": 0, "matched": 0, "results": {}}
+    for item in corpus:
+        if "reference_sql" not in item or item["question"] not in generated:
+            continue
+        sql = generated[item["question"]]
+        report["checked"] += 1
+        try:
+            actual = api.query_executor.run_query(sql)
+            expected = api.query_executor.run_query(item["reference_sql"])
+            ordered = "order by" in item["reference_sql"].lower()
+            matched, reason = frames_equivalent(actual, expected, ordered)
+        except Exception as e:
+            matched, reason = False, f"{type(e).__name__}: {e}"
+        report["matched"] += int(matched)
+        report["results"][item.get("id", item["question"])] = {"matched": matched, "reason": reason, "sql": sql}
+    return report
+
+
+def columnar_frame(payload: dict) -> pd.DataFrame:
+    return pd.DataFrame(dict(zip(payload["columns"], payload["data"])))
+
+
+async def check_result_endpoints(api, corpus: list, page_size: int) -> dict:
+    """Asks each question once and fetches page 2 and every view of its stored result, as "Load more" and the map do."""
+    import httpx
+
+    report = {"checked": 0, "passed": 0, "results": {}}
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=300) as client:
+        for item in corpus:
+            answer = await client.post("/ask", json={"question": item["question"]})
+            if answer.status_code != 200 or answer.json()["total_rows"] <= page_size:
+                continue
+            result_id = answer.json()["result_id"]
+            expected = api.result_store.get(result_id).iloc[page_size:2 * page_size]
+            report["checked"] += 1
+            problems = []
+
+            response = await client.get(f"/results/{result_id}", params={"cursor": str(page_size), "limit": page_size})
+            if response.status_code != 200:
+                problems.append(f"page 2: HTTP {response.status_code}")
+            else:
+                rows = columnar_frame(response.json()["data"])
+                if len(rows) != len(expected) or list(rows.columns) != [str(c) for c in expected.columns]:
+                    problems.append(f"page 2: got {rows.shape}, expected {expected.shape}")
+                else:
+                    for column in expected.select_dtypes(include="number").columns:
+                        if not np.isclose(rows[str(column)].astype(float), expected[column].astype(float),
+                                          equal_nan=True).all():
+                            problems.append(f"page 2: column {column} differs")
+            for view in api.RESULT_VIEWS:
+                response = await client.get(f"/results/{result_id}/views/{view}")
+                if response.status_code != 200:
+                    problems.append(f"view {view}: HTTP {response.status_code}")
+
+            report["passed"] += int(not problems)
+            report["results"][item.get("id", item["question"])] = {"passed": not problems, "problems": problems}
+    return report
+
+
+def check_map_bins(max_points: int) -> dict:
+    """Bins synthetic extents (square, a thin east-west band, a thin north-south band) and checks the point cap."""
+    from backend.results import spatial_bins
+
+    rng = np.random.default_rng(0)
+    extents = {"square": (180.0, 360.0), "east_west_band": (0.01, 360.0), "north_south_band": (160.0, 0.01)}
+    report = {"max_points": max_points, "passed": True, "results": {}}
+    for name, (lat_span, lon_span) in extents.items():
+        n = max_points * 20
+        df = pd.DataFrame({
+            "latitude": rng.uniform(-lat_span / 2, lat_span / 2, n),
+            "longitude": rng.uniform(-lon_span / 2, lon_span / 2, n),
+            "temperature": rng.normal(10, 5, n),
+        })
+        points = len(spatial_bins(df, max_points))
+        report["results"][name] = points
+        report["passed"] &= points <= max_points
+    return report
+
+
+def check_profile_points(budgets=(3, 5, 7, 50, 500)) -> dict:
+    """Downsamples a synthetic 2000-point profile to each budget, including ones too small for per-variable LTTB."""
+    from backend.results import profile_downsample
+
+    rng = np.random.default_rng(0)
+    n = 2000
+    df = pd.DataFrame({
+        "pressure": np.linspace(0, 2000, n),
+        "temperature": 20 * np.exp(-np.linspace(0, 5, n)) + rng.normal(0, 0.1, n),
+        "salinity": 35 + rng.normal(0, 0.05, n),
+    })
+    report = {"passed": True, "results": {}}
+    for max_points in budgets:
+        points = len(profile_downsample(df, max_points))
+        report["results"][str(max_points)] = points
+        report["passed"] &= points <= max_points
+    return report
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict, baseline: dict):
+    for level, r in report["levels"].items():
+        old = baseline.get("levels", {}).get(level, {})
+        print(f"\nconcurrency {level}: {r['requests']} requests, {r['errors']} errors, {r['throughput_rps']:.1f} req/s"
+              + (f" (was {old['throughput_rps']:.1f})" if old else ""))
+        print(f"  {'stage':<16}{'p50 (ms)':>10}{'p90 (ms)':>10}{'p99 (ms)':>10}{'count':>8}{'p50 before':>12}")
+        rows = {"end_to_end": r["latency"], **r["stages"]}
+        old_rows = {"end_to_end": old.get("latency", {}), **old.get("stages", {})}
+        for name, d in rows.items():
+            if not d.get("count"):
+                continue
+            before = old_rows.get(name, {}).get("p50_ms")
+            print(f"  {name:<16}{d['p50_ms']:>10.1f}{d['p90_ms']:>10.1f}{d['p99_ms']:>10.1f}{d['count']:>8}"
+                  + (f"{before:>12.1f}" if before is not None else ""))
+        print(f"  answer cache hit rate {r['cache']['answer_cache']['hit_rate']:.0%}, "
+              f"result cache hit rate {r['cache']['result_cache']['hit_rate']:.0%}")
+    eq = report["equivalence"]
+    print(f"\nresult equivalence: {eq['matched']}/{eq['checked']} match the reference SQL")
+    for name, result in eq["results"].items():
+        if not result["matched"]:
+            print(f"  ❌ {name}: {result['reason']}")
+    endpoints = report["result_endpoints"]
+    print(f"result paging and views: {endpoints['passed']}/{endpoints['checked']} answers OK")
+    for name, result in endpoints["results"].items():
+        if not result["passed"]:
+            print(f"  ❌ {name}: {'; '.join(result['problems'])}")
+    bins = report["map_bins"]
+    print(f"map binning: {'OK' if bins['passed'] else '❌ over the cap'} "
+          + ", ".join(f"{name} {points}/{bins['max_points']}" for name, points in bins["results"].items()))
+    profile = report["profile_points"]
+    print(f"profile downsampling: {'OK' if profile['passed'] else '❌ over the budget'} "
+          + ", ".join(f"{points}/{budget}" for budget, points in profile["results"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="JSON lines: question, sql, summary, reference_sql.")
+    parser.add_argument("--parquet", default=os.path.join(REPO_ROOT, "argo_final_data.parquet"))
+    parser.add_argument("--rebuild-fixture", action="store_true")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--repeat", type=int, default=3, help="Times the corpus is replayed per concurrency level.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds per recorded LLM call.")
+    parser.add_argument("--live-llm", action="store_true", help="Call Gemini instead of replaying recorded answers.")
+    parser.add_argument("--fake-retrieval", action="store_true", help="Skip the embedding model and Chroma.")
+    parser.add_argument("--page-size", type=int, default=5, help="Page size for the result paging check.")
+    parser.add_argument("--output", default="replay_results.json")
+    parser.add_argument("--compare", help="An earlier --output file to compare against.")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    fixture = build_fixture(args.parquet, args.rebuild_fixture)
+    api = load_api(fixture)
+    install_fakes(api, corpus, args)
+    traces = record_traces(api)
+    if args.fake_retrieval:
+        api.get_db_context()
+    else:
+        api.warm_up_resources()
+
+    questions = [item["question"] for item in corpus] * args.repeat
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "corpus": os.path.relpath(args.corpus, REPO_ROOT),
+            "questions": len(corpus),
+            "repeat": args.repeat,
+            "llm": "gemini" if args.live_llm else f"recorded ({args.llm_latency}s)",
+            "retrieval": "fake" if args.fake_retrieval else "chroma",
+            "backend": "duckdb fixture",
+        },
+        "levels": {},
+    }
+
+    async def run_levels():
+        # One event loop for every level: the API's semaphores and batchers bind to the loop they first run on
+        for level in args.concurrency:
+            # Every level starts with cold caches
+            api.answer_cache.invalidate()
+            api.result_cache.invalidate()
+            traces.clear()
+            result = await replay(api, questions, level)
+            stages, cache, errors = summarize_traces(traces)
+            report["levels"][str(level)] = {**result, "stages": stages, "cache": cache, "errors_by_stage": errors}
+        report["equivalence"] = check_equivalence(api, corpus, traces)
+        report["result_endpoints"] = await check_result_endpoints(api, corpus, args.page_size)
+
+    asyncio.run(run_levels())
+    report["map_bins"] = check_map_bins(api.MAP_MAX_POINTS)
+    report["profile_points"] = check_profile_points()
+    report["llm"] = api.llm_client.stats()
+
+    baseline = json.load(open(args.compare)) if args.compare else {}
+    print_report(report, baseline)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
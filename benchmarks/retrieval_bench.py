@@ -0,0 +1,210 @@
+# retrieval_bench.py
+
+"""
+Retrieval latency and recall for the Chroma collections.
+
+For each question we time the ANN query (with the metadata pre-filter the API
+would derive, and without it) and compare its top-k against an exact
+brute-force search over the same filtered subset to get recall@k.
+--tune-ef re-runs the filtered queries for several hnsw:search_ef values so
+you can pick the smallest one that keeps recall where you want it; the
+collection's original metadata is restored afterwards.
+
+Dates and platform numbers in the questions are taken from the collection
+itself, and questions whose filter matches no document are dropped (and
+reported), so recall is never averaged over empty filters.
+
+Usage (from the repository root):
+    python benchmarks/retrieval_bench.py --k 3
+    python benchmarks/retrieval_bench.py --collection argo_cycle_summaries --tune-ef 10 25 50 100 200
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from collections import Counter
+
+import chromadb
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.retrieval import (  # noqa: E402
+    CYCLE_COLLECTION,
+    MONTHS,
+    WHERE_BUILDERS,
+    constraints_from_question,
+)
+
+
+CHROMA_DEFAULT_SEARCH_EF = 10
+
+# (question, expected constraints_from_question output), covering both WMO ID lengths and a bare number
+CONSTRAINT_CASES = [
+    ("Show float 53555 data from 2002", {"platforms": ["53555"], "date": (20020101, 20021231)}),
+    ("Show me the temperature profile of float 5905233", {"platforms": ["5905233"]}),
+    ("Compare floats 53546 and 5905233 in March 2001",
+     {"platforms": ["53546", "5905233"], "date": (20010301, 20010331)}),
+    ("Which floats were active near the equator in 2001?", {"date": (20010101, 20011231), "lat": (-5.0, 5.0)}),
+    ("Which floats have more than 20000 measurements in 2002?", {"date": (20020101, 20021231)}),
+    ("What is the warmest float in the Antarctic?", {"lat": (-90.0, -60.0)}),
+    ("What is the warmest float in the Arctic?", {"lat": (66.5, 90.0)}),
+]
+
+
+def check_constraints() -> bool:
+    ok = True
+    for question, expected in CONSTRAINT_CASES:
+        got = constraints_from_question(question)
+        if got != expected:
+            print(f"❌ constraints_from_question({question!r}) = {got}, expected {expected}")
+            ok = False
+    return ok
+
+
+def matches(metadata: dict, where) -> bool:
+    """Evaluates the subset of Chroma's `where` syntax produced by backend.retrieval."""
+    if where is None:
+        return True
+    if "$and" in where:
+        return all(matches(metadata, clause) for clause in where["$and"])
+    (field, condition), = where.items()
+    value = metadata.get(field)
+    if value is None:
+        return False
+    (op, operand), = condition.items()
+    if op == "$gte":
+        return value >= operand
+    if op == "$lte":
+        return value <= operand
+    if op == "$in":
+        return value in operand
+    raise ValueError(f"Unsupported operator {op}")
+
+
+def build_questions(metadatas: list) -> list:
+    """Benchmark questions using a year, month and platform numbers that occur in the collection."""
+    dates = sorted(d for m in metadatas for d in (m.get("date"), m.get("first_seen")) if d)
+    median = dates[len(dates) // 2]
+    year, month = median // 10000, (median // 100) % 100
+    month_name = next(name for name, number in MONTHS.items() if number == month).capitalize()
+    # The busiest float of each WMO ID length (5 and 7 digits)
+    by_length = {}
+    for platform, _ in Counter(m["platform_number"] for m in metadatas if "platform_number" in m).most_common():
+        by_length.setdefault(len(platform), platform)
+    platforms = list(by_length.values())
+
+    questions = [
+        "Which float was furthest south?",
+        "What was the warmest float near the equator?",
+        f"Show profiles near the equator in {year}",
+        f"Which floats were active in the southern hemisphere in {month_name} {year}?",
+        "What is the average surface salinity in the tropics?",
+        "Which float recorded the coldest surface temperature in the arctic?",
+    ]
+    for platform in platforms:
+        questions.append(f"Show me the temperature profile of float {platform}")
+    if platforms:
+        questions.append(f"How many cycles did float {platforms[0]} complete in {year}?")
+    return questions
+
+
+def exact_top_k(embeddings: np.ndarray, ids: list, metadatas: list, query: np.ndarray, k: int, where, space: str):
+    mask = np.array([matches(m, where) for m in metadatas])
+    if not mask.any():
+        return []
+    candidates = embeddings[mask]
+    candidate_ids = [i for i, keep in zip(ids, mask) if keep]
+    if space == "cosine":
+        normed = candidates / np.linalg.norm(candidates, axis=1, keepdims=True)
+        distances = 1 - normed @ (query / np.linalg.norm(query))
+    elif space == "ip":
+        distances = -(candidates @ query)
+    else:
+        distances = ((candidates - query) ** 2).sum(axis=1)
+    return [candidate_ids[i] for i in np.argsort(distances)[:k]]
+
+
+def answerable(questions: list, collection_name: str, metadatas: list) -> list:
+    """Drops questions whose pre-filter matches no document in the collection."""
+    kept = []
+    for question in questions:
+        constraints = constraints_from_question(question)
+        where = WHERE_BUILDERS[collection_name](constraints) if constraints else None
+        if any(matches(m, where) for m in metadatas):
+            kept.append(question)
+        else:
+            print(f"⚠️ Skipping {question!r}: its filter matches no document.")
+    return kept
+
+
+def run(collection, model, k: int, corpus, questions: list):
+    ids, embeddings, metadatas, space = corpus
+    latencies = {"unfiltered": [], "filtered": []}
+    recalls = []
+    for question in questions:
+        query = model.encode(question)
+        constraints = constraints_from_question(question)
+        where = WHERE_BUILDERS[collection.name](constraints) if constraints else None
+
+        start = time.perf_counter()
+        collection.query(query_embeddings=[query.tolist()], n_results=k)
+        latencies["unfiltered"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, where=where)
+        latencies["filtered"].append(time.perf_counter() - start)
+
+        expected = exact_top_k(embeddings, ids, metadatas, query, k, where, space)
+        if expected:
+            recalls.append(len(set(result["ids"][0]) & set(expected)) / len(expected))
+    return latencies, recalls
+
+
+def report(label: str, latencies: dict, recalls: list):
+    for kind, values in latencies.items():
+        ms = sorted(v * 1000 for v in values)
+        print(f"{label:<14}{kind:<12}{statistics.median(ms):>10.2f}{ms[int(0.95 * (len(ms) - 1))]:>10.2f}", end="")
+        print(f"{statistics.mean(recalls):>10.3f}" if kind == "filtered" and recalls else "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval latency and recall.")
+    parser.add_argument("--collection", default=CYCLE_COLLECTION)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--tune-ef", type=int, nargs="*", help="hnsw:search_ef values to sweep.")
+    args = parser.parse_args()
+
+    if not check_constraints():
+        sys.exit(1)
+
+    client = chromadb.PersistentClient(path="chroma_db")
+    collection = client.get_collection(args.collection)
+    model = SentenceTransformer("all-MiniLM-L6-v2")
+
+    print(f"Loading {collection.count()} embeddings from '{args.collection}' for exact search...")
+    data = collection.get(include=["embeddings", "metadatas"])
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    corpus = (data["ids"], np.asarray(data["embeddings"], dtype=np.float32), data["metadatas"], space)
+    questions = answerable(build_questions(data["metadatas"]), args.collection, data["metadatas"])
+    print(f"{len(questions)} questions.")
+
+    print(f"{'setting':<14}{'query':<12}{'p50 (ms)':>10}{'p95 (ms)':>10}{'recall@' + str(args.k):>10}")
+    report("default", *run(collection, model, args.k, corpus, questions))
+    original_metadata = dict(collection.metadata or {})
+    try:
+        for ef in args.tune_ef or []:
+            collection.modify(metadata={**original_metadata, "hnsw:search_ef": ef})
+            report(f"search_ef={ef}", *run(collection, model, args.k, corpus, questions))
+    finally:
+        # The sweep changes the collection the API uses; put its settings back
+        if args.tune_ef:
+            search_ef = original_metadata.get("hnsw:search_ef", CHROMA_DEFAULT_SEARCH_EF)
+            collection.modify(metadata={**original_metadata, "hnsw:search_ef": search_ef})
+
+
+if __name__ == "__main__":
+    main()
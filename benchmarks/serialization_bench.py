@@ -0,0 +1,85 @@
+# serialization_bench.py
+
+"""
+Compares the old per-cell result conversion with the columnar fast path.
+
+Rows are taken from argo_final_data.parquet, so the column types match what
+/ask returns. For each size we time:
+  - records  : the old path. Each numeric cell goes through `apply(lambda)`, then
+               `to_dict(orient='records')`, then FastAPI's JSON encoder.
+  - columnar : backend.serialization.columnar + orjson, the /ask JSON response
+  - arrow    : backend.serialization.to_arrow_ipc, the negotiated Arrow IPC response
+
+Usage (from the repository root):
+    python benchmarks/serialization_bench.py --rows 1000 10000 100000
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from backend.serialization import columnar, dumps, to_arrow_ipc  # noqa: E402
+
+
+def records_path(df: pd.DataFrame) -> bytes:
+    df = df.copy()
+    for col in df.select_dtypes(include=['datetime64[ns]']).columns:
+        df[col] = df[col].astype(str)
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col].dtype):
+            df[col] = df[col].apply(lambda x: float(x) if isinstance(x, np.number) else x)
+    records = df.to_dict(orient='records')
+    return JSONResponse(jsonable_encoder(records)).body
+
+
+def columnar_path(df: pd.DataFrame) -> bytes:
+    return dumps(columnar(df))
+
+
+def arrow_path(df: pd.DataFrame) -> bytes:
+    return to_arrow_ipc(df)
+
+
+PATHS = {"records": records_path, "columnar": columnar_path, "arrow": arrow_path}
+
+
+def time_path(fn, df: pd.DataFrame, runs: int) -> dict:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        body = fn(df)
+        timings.append(time.perf_counter() - start)
+    return {"median_ms": statistics.median(timings) * 1000, "bytes": len(body)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parquet", default=os.path.join(REPO_ROOT, "argo_final_data.parquet"))
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    source = pd.read_parquet(args.parquet)
+    source = source.reset_index(drop=True)
+    results = {}
+    for rows in args.rows:
+        df = source.head(rows)
+        results[rows] = {name: time_path(fn, df, args.runs) for name, fn in PATHS.items()}
+        line = "  ".join(f"{name}={r['median_ms']:.1f}ms/{r['bytes'] / 1024:.0f}KiB" for name, r in results[rows].items())
+        print(f"{rows:>8} rows  {line}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# startup_bench.py
+
+"""
+Measures API startup time and resident memory for each STARTUP_MODE.
+
+Every run happens in a fresh interpreter, so module and model caches from one
+run can't flatter the next. For each mode we record:
+  - import_s : time for `from backend import api` (what blocks a uvicorn worker from serving)
+  - ready_s  : time until the embedding model, vector store and DB context are all loaded
+  - rss_mb   : resident set size once ready
+
+Usage (from the repository root):
+    python benchmarks/startup_bench.py --runs 3
+    python benchmarks/startup_bench.py --embedding-service-url http://127.0.0.1:8001
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, time
+start = time.perf_counter()
+from backend import api
+import_s = time.perf_counter() - start
+api.warm_up_resources()
+ready_s = time.perf_counter() - start
+with open("/proc/self/status") as f:
+    rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+print(json.dumps({"import_s": import_s, "ready_s": ready_s, "rss_mb": rss_kb / 1024}))
+"""
+
+
+def run_once(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API startup time and RSS.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--embedding-service-url", help="Also measure a worker that uses the shared embedding service.")
+    args = parser.parse_args()
+
+    scenarios = [("preload", {"STARTUP_MODE": "preload"}), ("warm/lazy", {"STARTUP_MODE": "lazy"})]
+    if args.embedding_service_url:
+        scenarios.append(("remote-embed", {"STARTUP_MODE": "lazy", "EMBEDDING_SERVICE_URL": args.embedding_service_url}))
+
+    print(f"{'mode':<15}{'import (s)':>12}{'ready (s)':>12}{'RSS (MB)':>12}")
+    for name, overrides in scenarios:
+        env = {**os.environ, **overrides}
+        runs = [run_once(env) for _ in range(args.runs)]
+        print(
+            f"{name:<15}"
+            f"{statistics.median(r['import_s'] for r in runs):>12.2f}"
+            f"{statistics.median(r['ready_s'] for r in runs):>12.2f}"
+            f"{statistics.median(r['rss_mb'] for r in runs):>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
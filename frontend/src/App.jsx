@@ -5,10 +5,58 @@ import LoadingBubble from './components/LoadingBubble';
 import ChatInput from './components/ChatInput';
 import ErrorBoundary from './components/ErrorBoundary'; // <-- IMPORT THE ERROR BOUNDARY
 
+const STAGE_LABELS = {
+  retrieving: 'Looking up relevant floats...',
+  generating_sql: 'Writing the SQL query...',
+  running_query: 'Running the query...',
+  summarizing: 'Summarizing the results...',
+};
+
+// Errors come back as { error, message, stage, trace_id }; older responses used a plain string.
+const errorText = (detail) => (typeof detail === 'string' ? detail : detail?.message);
+
+// Turns a columnar chunk ({ columns, data: [one array per column] }) into row objects for the components.
+function rowsFromColumns({ columns, data }) {
+  const length = data.length ? data[0].length : 0;
+  const rows = new Array(length);
+  for (let i = 0; i < length; i++) {
+    const row = {};
+    for (let c = 0; c < columns.length; c++) row[columns[c]] = data[c][i];
+    rows[i] = row;
+  }
+  return rows;
+}
+
+// Reads a Server-Sent Events body from fetch() and calls onEvent(event, data) for each message.
+async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      onEvent(event, JSON.parse(data));
+    }
+  }
+}
+
 function App() {
   const [messages, setMessages] = useState([]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  // True once the first event of the current answer has arrived (its bubble then shows the progress)
+  const [isStreaming, setIsStreaming] = useState(false);
   const messagesEndRef = useRef(null);
 
   useEffect(() => {
@@ -23,6 +71,20 @@ function App() {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [messages]);
 
+  // Fetches the next page of a stored result and appends it to the message's table.
+  const loadMoreRows = async (msg) => {
+    try {
+      const response = await fetch(`http://127.0.0.1:8000/results/${msg.resultId}?cursor=${encodeURIComponent(msg.nextCursor)}`);
+      const page = await response.json();
+      if (!response.ok) throw new Error(errorText(page.detail) || `API error: ${response.statusText}`);
+      setMessages((prev) => prev.map((m) => (
+        m.id === msg.id ? { ...m, data: m.data.concat(rowsFromColumns(page.data)), nextCursor: page.next_cursor } : m
+      )));
+    } catch (error) {
+      setMessages((prev) => prev.map((m) => (m.id === msg.id ? { ...m, pageError: error.message } : m)));
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     if (!input.trim() || isLoading) return;
@@ -36,8 +98,20 @@ function App() {
     setIsLoading(true);
     setInput('');
 
+    // The assistant message is created on the first event and filled in as the stream arrives.
+    const assistantId = crypto.randomUUID();
+    let started = false;
+    const updateAssistant = (patch) => {
+      if (!started) {
+        started = true;
+        setIsStreaming(true);
+        setMessages((prev) => [...prev, { id: assistantId, role: 'assistant', content: '', data: [], sql: null }]);
+      }
+      setMessages((prev) => prev.map((m) => (m.id === assistantId ? { ...m, ...patch(m) } : m)));
+    };
+
     try {
-      const response = await fetch('http://127.0.0.1:8000/ask', {
+      const response = await fetch('http://127.0.0.1:8000/ask/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ question: input }),
@@ -45,21 +119,47 @@ function App() {
 
       if (!response.ok) {
         const errorData = await response.json();
-        throw new Error(errorData.detail || `API error: ${response.statusText}`);
+        throw new Error(errorText(errorData.detail) || `API error: ${response.statusText}`);
       }
 
-      const data = await response.json();
-      
-      const assistantMessage = {
-        id: crypto.randomUUID(), // <-- ADD UNIQUE ID
-        role: 'assistant',
-        content: data.summary,
-        data: data.data,
-        sql: data.sql_query,
-      };
-      setMessages((prev) => [...prev, assistantMessage]);
+      let streamError = null;
+      await readEventStream(response, (event, data) => {
+        switch (event) {
+          case 'status':
+            updateAssistant(() => ({ status: STAGE_LABELS[data.stage] || data.stage }));
+            break;
+          case 'sql':
+            updateAssistant(() => ({ sql: data.sql_query }));
+            break;
+          case 'rows':
+            updateAssistant((m) => ({ data: m.data.concat(rowsFromColumns(data)) }));
+            break;
+          case 'summary':
+            updateAssistant((m) => ({ content: m.content + data.token }));
+            break;
+          case 'done':
+            updateAssistant(() => ({
+              status: null,
+              resultId: data.result_id,
+              totalRows: data.total_rows,
+              nextCursor: data.next_cursor,
+              views: {
+                map: data.views.map && rowsFromColumns(data.views.map),
+                profile: data.views.profile && rowsFromColumns(data.views.profile),
+              },
+            }));
+            break;
+          case 'error':
+            streamError = errorText(data.detail);
+            break;
+          default:
+            break;
+        }
+      });
+      if (streamError) throw new Error(streamError);
 
     } catch (error) {
+      if (started) updateAssistant(() => ({ status: null }));
       const errorMessage = { 
         id: crypto.randomUUID(), // <-- ADD UNIQUE ID
         role: 'assistant', 
@@ -68,6 +168,8 @@ function App() {
       };
       setMessages((prev) => [...prev, errorMessage]);
     } finally {
+      // Input stays disabled until the stream has ended (`done`, `error` or a dropped connection)
+      setIsStreaming(false);
       setIsLoading(false);
     }
   };
@@ -85,11 +187,11 @@ function App() {
         {messages.map((msg) => (
           // --- WRAP THE BUBBLE IN THE ERROR BOUNDARY ---
           <ErrorBoundary key={msg.id}> 
-            <MessageBubble msg={msg} />
+            <MessageBubble msg={msg} onLoadMore={loadMoreRows} />
           </ErrorBoundary>
           // --- END OF WRAPPER ---
         ))}
-        {isLoading && <LoadingBubble />}
+        {isLoading && !isStreaming && <LoadingBubble />}
         <div ref={messagesEndRef} />
       </main>
 
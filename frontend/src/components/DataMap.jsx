@@ -19,6 +19,7 @@ const DataMap = ({ data }) => {
                     <Marker key={index} position={[point.latitude, point.longitude]}>
                         <Popup>
                             Float: {point.platform_number || 'N/A'}<br />
+                            {point.count > 1 && <>Points averaged: {point.count}<br /></>}
                             Temp: {point.temperature?.toFixed(2) || 'N/A'} °C<br />
                             Lat: {point.latitude.toFixed(3)}, Lon: {point.longitude.toFixed(3)}
                         </Popup>
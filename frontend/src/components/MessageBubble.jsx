@@ -4,7 +4,7 @@ import DataTable from './DataTable';
 import DataMap from './DataMap';
 import ProfileChart from './ProfileChart';
 
-const MessageBubble = ({ msg }) => {
+const MessageBubble = ({ msg, onLoadMore }) => {
   // --- INTELLIGENT DISPLAY LOGIC ---
   const hasData = msg.data && msg.data.length > 0;
   
@@ -20,11 +20,16 @@ const MessageBubble = ({ msg }) => {
                         new Set(msg.data.map(d => d.platform_number)).size === 1; // Must be for a single float
   // --- END OF LOGIC ---
 
+  // Large results come with server-side downsampled views for the map and chart
+  const mapData = msg.views?.map || msg.data;
+  const profileData = msg.views?.profile || msg.data;
+
   return (
     <div className={`flex items-start gap-4 ${msg.role === 'user' ? 'justify-end' : ''}`}>
       {msg.role === 'assistant' && <Bot className="text-cyan-400 flex-shrink-0 mt-1" size={28} />}
       <div className={`p-4 rounded-lg max-w-4xl w-full shadow-md ${msg.role === 'user' ? 'bg-blue-600' : 'bg-slate-700'} ${msg.isError ? 'bg-red-800/50 border border-red-500' : ''}`}>
         <p className="whitespace-pre-wrap">{msg.content}</p>
+        {msg.status && <p className="text-sm text-slate-400 italic">{msg.status}</p>}
         
         {msg.sql && (
           <div className="mt-4 border-t border-slate-600 pt-2">
@@ -36,10 +41,20 @@ const MessageBubble = ({ msg }) => {
         {/* --- CONDITIONAL RENDERING --- */}
         {/* If it's profile data, show the chart. Otherwise, show the table. */}
         {hasData && !isProfileData && <DataTable data={msg.data} />}
-        {isProfileData && <ProfileChart data={msg.data} />}
+        {isProfileData && <ProfileChart data={profileData} />}
+
+        {msg.totalRows > msg.data?.length && (
+          <div className="mt-2 flex items-center gap-3 text-xs text-slate-400">
+            <span>Showing {msg.data.length} of {msg.totalRows} rows</span>
+            {msg.nextCursor && onLoadMore && (
+              <button onClick={() => onLoadMore(msg)} className="px-2 py-1 rounded bg-slate-600 hover:bg-slate-500 text-slate-100">Load more</button>
+            )}
+            {msg.pageError && <span className="text-red-400">{msg.pageError}</span>}
+          </div>
+        )}
 
         {/* Always render the Map if location data is present */}
-        {hasLocationData && <DataMap data={msg.data} />}
+        {hasLocationData && <DataMap data={mapData} />}
         {/* --- END OF RENDERING --- */}
 
       </div>
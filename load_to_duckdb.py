@@ -0,0 +1,78 @@
+# load_to_duckdb.py
+
+"""
+Builds a DuckDB database file from argo_final_data.parquet, for QUERY_BACKEND=duckdb.
+
+The file gets the same column types and summary tables as load_to_sql.py,
+plus an argo_metadata table holding the DB context for the SQL prompt.
+Rows repeating a (platform_number, cycle_number, pressure) key are dropped,
+keeping the first in file order, as load_to_sql.py does on a full load.
+Measurements are sorted by platform_number, cycle_number and pressure, so
+DuckDB's per-row-group min/max can skip most of the file for per-float queries.
+The new file is written next to the old one and renamed over it, so a running
+API (which reopens the file when its version changes) never sees a half-built database.
+
+    python load_to_duckdb.py                      # writes argo.duckdb
+    python load_to_duckdb.py --output /data/argo.duckdb --threads 8
+"""
+
+import argparse
+import json
+import os
+import time
+
+import duckdb
+
+from backend.db import compute_duckdb_context, parquet_rows_sql
+from backend.metadata import DATA_VERSION_KEY, DB_CONTEXT_KEY, METADATA_TABLE
+from load_to_sql import parquet_file, summary_tables, table_name
+
+duckdb_file = 'argo.duckdb'
+
+
+def build(parquet: str, output: str, threads: int = None):
+    temp_output = f"{output}.tmp"
+    for path in (temp_output, f"{temp_output}.wal"):
+        if os.path.exists(path):
+            os.remove(path)
+
+    conn = duckdb.connect(temp_output, config={"threads": threads} if threads else {})
+
+    start = time.time()
+    conn.execute(f"""
+        CREATE TABLE {table_name} AS
+        {parquet_rows_sql(conn, parquet)}
+        ORDER BY platform_number, cycle_number, pressure
+    """)
+    rows = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    print(f"✅ Loaded {rows} rows into '{table_name}' in {time.time() - start:.1f}s.")
+
+    source_table = table_name
+    for table in summary_tables:
+        conn.execute(f"CREATE TABLE {table['name']} AS " + table["select"].format(source=source_table, where=""))
+        source_table = table["name"]
+        print(f"✅ Built summary table '{table['name']}'.")
+
+    context = compute_duckdb_context(conn, table_name, summary_tables)
+    conn.execute(f"CREATE TABLE {METADATA_TABLE} (key VARCHAR PRIMARY KEY, value VARCHAR)")
+    conn.execute(
+        f"INSERT INTO {METADATA_TABLE} VALUES (?, ?), (?, ?)",
+        [DATA_VERSION_KEY, str(time.time_ns()), DB_CONTEXT_KEY, json.dumps(context)],
+    )
+    conn.execute("CHECKPOINT")
+    conn.close()
+    os.replace(temp_output, output)
+    print(f"✅ Wrote {output}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a DuckDB database from the ARGO parquet data.")
+    parser.add_argument("--parquet", default=parquet_file, help="Parquet file to load.")
+    parser.add_argument("--output", default=duckdb_file, help="DuckDB file to write.")
+    parser.add_argument("--threads", type=int, default=None, help="DuckDB worker threads (default: all cores).")
+    args = parser.parse_args()
+    build(args.parquet, args.output, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,44 @@
 # load_to_sql.py
 
-import pandas as pd
-from sqlalchemy import create_engine
+"""
+Streams argo_final_data.parquet into PostgreSQL.
+
+Row groups are read with pyarrow one batch at a time and sent with
+`COPY ... FROM STDIN`, so memory stays flat regardless of the file size.
+
+Two modes:
+  python load_to_sql.py                 full reload: load into a staging table and swap it in atomically
+  python load_to_sql.py --incremental   append only the cycles newer than each float's watermark
+
+The table gets explicit column types and indexes matching the queries the
+LLM writes (per-float filters, date ranges on juld, ORDER BY latitude/longitude
+LIMIT 1, latitude BETWEEN ...). Add --partition-by-year to range-partition it on juld.
+"""
+
+import argparse
+import io
+import json
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+from sqlalchemy import create_engine, text
+from tqdm import tqdm
+
+from backend.metadata import (
+    ALL_PLATFORMS,
+    COLUMN_TYPES,
+    DB_CONTEXT_KEY,
+    DEDUP_KEY,
+    METADATA_TABLE,
+    bump_data_version,
+    compute_db_context,
+    mark_platforms_changed,
+    store_db_context,
+    write_metadata,
+)
 
 # --- DATABASE CONNECTION DETAILS ---
 # IMPORTANT: Replace with your own PostgreSQL credentials
@@ -13,38 +50,457 @@ db_name = 'argo_db'
 
 # --- The name of our data table ---
 table_name = 'argo_data'
+staging_table = f'{table_name}_staging'
+incoming_table = f'{table_name}_incoming'
+watermark_table = 'argo_ingest_watermarks'
+
+# --- Rows are unique on this key: full loads drop duplicates after COPY, incremental loads skip them ---
+dedup_key = DEDUP_KEY
+
+# --- Physical layout ---
+# Column types shared with the DuckDB backends (backend/metadata.py)
+column_types = COLUMN_TYPES
+# Arrow casts applied to each batch before COPY so the values match the column types above
+arrow_casts = {'cycle_number': pa.int32()}
+# Index name suffix -> definition. Built after COPY, which is much faster than maintaining them row by row.
+indexes = {
+    'platform_cycle_idx': '(platform_number, cycle_number)',
+    'juld_idx': '(juld)',
+    'latitude_idx': '(latitude)',
+    'longitude_idx': '(longitude)',
+}
+
+# --- Precomputed summary tables ---
+# Small tables for the aggregates users ask about most. Both are rebuilt on a
+# full load and refreshed only for the changed floats on an incremental load.
+# `{source}` is the measurement table and `{where}` an optional platform filter.
+cycle_summary_table = 'argo_cycle_summary'
+float_summary_table = 'argo_float_summary'
+summary_tables = [
+    {
+        "name": cycle_summary_table,
+        "description": "One row per profile (platform_number + cycle_number) with its date, position, "
+                       "surface (shallowest) and deepest temperature/salinity.",
+        "key": "platform_number, cycle_number",
+        "select": """
+            SELECT
+                platform_number,
+                cycle_number,
+                MIN(juld) AS juld,
+                AVG(latitude) AS latitude,
+                AVG(longitude) AS longitude,
+                COUNT(*) AS n_levels,
+                MIN(pressure) AS min_pressure,
+                MAX(pressure) AS max_pressure,
+                (ARRAY_AGG(temperature ORDER BY pressure ASC) FILTER (WHERE temperature IS NOT NULL AND pressure IS NOT NULL))[1] AS surface_temperature,
+                (ARRAY_AGG(salinity ORDER BY pressure ASC) FILTER (WHERE salinity IS NOT NULL AND pressure IS NOT NULL))[1] AS surface_salinity,
+                (ARRAY_AGG(temperature ORDER BY pressure DESC) FILTER (WHERE temperature IS NOT NULL AND pressure IS NOT NULL))[1] AS deepest_temperature,
+                (ARRAY_AGG(salinity ORDER BY pressure DESC) FILTER (WHERE salinity IS NOT NULL AND pressure IS NOT NULL))[1] AS deepest_salinity
+            FROM {source}
+            {where}
+            GROUP BY platform_number, cycle_number
+        """,
+    },
+    {
+        "name": float_summary_table,
+        "description": "One row per float with its cycle count, first/last dates, lat/lon bounds "
+                       "and average surface temperature/salinity.",
+        "key": "platform_number",
+        # Built from the cycle summary, not from the measurements
+        "select": """
+            SELECT
+                platform_number,
+                COUNT(*) AS total_cycles,
+                MIN(juld)::date AS first_seen,
+                MAX(juld)::date AS last_seen,
+                MIN(latitude) AS min_lat,
+                MAX(latitude) AS max_lat,
+                MIN(longitude) AS min_lon,
+                MAX(longitude) AS max_lon,
+                AVG(surface_temperature) AS avg_surface_temperature,
+                AVG(surface_salinity) AS avg_surface_salinity
+            FROM {source}
+            {where}
+            GROUP BY platform_number
+        """,
+    },
+]
 
 # --- Path to our data file ---
 parquet_file = 'argo_final_data.parquet'
 
-print(f"Reading data from {parquet_file}...")
-df = pd.read_parquet(parquet_file)
+# --- Rows per COPY batch (one pyarrow record batch) ---
+batch_rows = 100_000
 
-# The 'platform_number' column was read as a binary object, let's decode it
-# This is a common step when moving from certain file formats
-if 'platform_number' in df.columns and df['platform_number'].dtype == 'object':
-    # Check if the column contains bytes and decode
-    if isinstance(df['platform_number'].iloc[0], bytes):
-        df['platform_number'] = df['platform_number'].str.decode('utf-8')
 
+def postgres_type(field: pa.Field) -> str:
+    """Returns the PostgreSQL type for a column: the tuned type if we have one, else one derived from Arrow."""
+    if field.name in column_types:
+        return column_types[field.name]
+    arrow_type = field.type
+    if pa.types.is_boolean(arrow_type):
+        return "BOOLEAN"
+    if pa.types.is_integer(arrow_type):
+        return "BIGINT"
+    if pa.types.is_floating(arrow_type):
+        return "DOUBLE PRECISION"
+    if pa.types.is_timestamp(arrow_type):
+        return "TIMESTAMPTZ" if arrow_type.tz else "TIMESTAMP"
+    if pa.types.is_date(arrow_type):
+        return "DATE"
+    return "TEXT"
 
-print(f"Successfully loaded {len(df)} rows.")
 
-# Create the connection string for SQLAlchemy
-engine_string = f"postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
-engine = create_engine(engine_string)
+def _is_binary(arrow_type: pa.DataType) -> bool:
+    return pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type)
 
-print(f"Connecting to database '{db_name}' and loading data into table '{table_name}'...")
 
-# Use df.to_sql to load the data
-# if_exists='replace': Deletes the old table and creates a new one. Good for re-running the script.
-# chunksize: Loads data in batches of 1000 rows to avoid using too much memory.
-df.to_sql(
-    table_name,
-    con=engine,
-    if_exists='replace',
-    index=False,
-    chunksize=1000
-)
+def prepare_column(name: str, column: pa.Array) -> pa.Array:
+    """Decodes binary columns (e.g. platform_number) to UTF-8 and applies `arrow_casts`, vectorized."""
+    if _is_binary(column.type):
+        return pc.cast(column, pa.string())
+    if name in arrow_casts:
+        if pa.types.is_floating(column.type):
+            # NaN can't be cast to an integer; store it as NULL
+            column = pc.if_else(pc.is_nan(column), pa.scalar(None, column.type), column)
+        return pc.cast(column, arrow_casts[name])
+    return column
+
+
+def decode_batch(batch: pa.RecordBatch) -> pa.RecordBatch:
+    """Prepares a whole record batch for COPY."""
+    columns = [prepare_column(name, column) for name, column in zip(batch.schema.names, batch.columns)]
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+
+def data_columns(parquet: pq.ParquetFile) -> list:
+    """The columns to load: everything except the pandas index that to_parquet stored alongside the data."""
+    index_columns = (parquet.schema_arrow.pandas_metadata or {}).get("index_columns", [])
+    return [name for name in parquet.schema_arrow.names if name not in index_columns]
+
+
+def output_schema(parquet: pq.ParquetFile) -> pa.Schema:
+    """The Arrow schema after decoding, used to create the table."""
+    fields = []
+    for name in data_columns(parquet):
+        field = parquet.schema_arrow.field(name)
+        if _is_binary(field.type):
+            field = pa.field(name, pa.string())
+        elif name in arrow_casts:
+            field = pa.field(name, arrow_casts[name])
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def iter_batches(parquet: pq.ParquetFile):
+    return parquet.iter_batches(batch_size=batch_rows, columns=data_columns(parquet))
+
+
+def juld_years(parquet: pq.ParquetFile) -> range:
+    """The range of years covered by juld, from the parquet row-group statistics (empty if unavailable)."""
+    years = []
+    for i in range(parquet.num_row_groups):
+        row_group = parquet.metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            column = row_group.column(j)
+            if column.path_in_schema == 'juld' and column.statistics is not None and column.statistics.has_min_max:
+                years += [v.year for v in (column.statistics.min, column.statistics.max) if hasattr(v, 'year')]
+    return range(min(years), max(years) + 1) if years else range(0)
+
+
+def create_table(conn, table: str, schema: pa.Schema, partition_years: range = None):
+    """Creates the table with tuned column types, optionally range-partitioned by year on juld.
+
+    Partitions are named `<table>_y<year>` plus a `<table>_default` catch-all for
+    years outside the range (e.g. added later by incremental loads).
+    """
+    column_defs = ", ".join(f'"{f.name}" {postgres_type(f)}' for f in schema)
+    if partition_years is None:
+        conn.execute(text(f"CREATE TABLE {table} ({column_defs})"))
+        return
+    conn.execute(text(f"CREATE TABLE {table} ({column_defs}) PARTITION BY RANGE (juld)"))
+    for year in partition_years:
+        conn.execute(text(
+            f"CREATE TABLE {table}_y{year} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        ))
+    conn.execute(text(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT"))
+
+
+def create_indexes(conn, table: str):
+    for suffix, definition in indexes.items():
+        conn.execute(text(f"CREATE INDEX {table}_{suffix} ON {table} {definition}"))
+
+
+def rename_table_objects(conn, old_prefix: str, new_prefix: str):
+    """Renames the indexes and partitions created for the staging table to their final names."""
+    for suffix in indexes:
+        conn.execute(text(f"ALTER INDEX IF EXISTS {old_prefix}_{suffix} RENAME TO {new_prefix}_{suffix}"))
+    partitions = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent"
+    ), {"parent": new_prefix}).scalars().all()
+    for partition in partitions:
+        if partition.startswith(old_prefix):
+            conn.execute(text(f"ALTER TABLE {partition} RENAME TO {new_prefix}{partition[len(old_prefix):]}"))
+
+
+def copy_batch(cursor, table: str, batch: pa.RecordBatch) -> int:
+    """Sends one record batch to PostgreSQL through COPY FROM STDIN (CSV); returns the bytes sent."""
+    buffer = io.BytesIO()
+    pacsv.write_csv(batch, buffer, pacsv.WriteOptions(include_header=False))
+    size = buffer.tell()
+    buffer.seek(0)
+    columns = ", ".join(f'"{name}"' for name in batch.schema.names)
+    cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+    return size
+
+
+def rebuild_watermarks(conn, source_table: str):
+    """Recomputes the per-float watermark (highest loaded cycle) from a full table."""
+    conn.execute(text(f"DROP TABLE IF EXISTS {watermark_table}"))
+    conn.execute(text(
+        f"CREATE TABLE {watermark_table} AS "
+        f"SELECT platform_number, MAX(cycle_number) AS max_cycle_number, CURRENT_TIMESTAMP AS updated_at "
+        f"FROM {source_table} GROUP BY platform_number"
+    ))
+    conn.execute(text(f"ALTER TABLE {watermark_table} ADD PRIMARY KEY (platform_number)"))
+
+
+def load_watermarks(conn):
+    """Returns the watermarks as two aligned Arrow arrays (platform_number, max_cycle_number)."""
+    rows = conn.execute(text(f"SELECT platform_number, max_cycle_number FROM {watermark_table}")).fetchall()
+    platforms = pa.array([r[0] for r in rows], type=pa.string())
+    cycles = pa.array([r[1] for r in rows], type=pa.float64())
+    return platforms, cycles
+
+
+def new_cycles_only(batch: pa.RecordBatch, wm_platforms: pa.Array, wm_cycles: pa.Array) -> pa.RecordBatch:
+    """Keeps rows whose cycle is above their float's watermark (all rows for floats we haven't seen)."""
+    platforms = batch.column(batch.schema.get_field_index("platform_number"))
+    cycles = pc.cast(batch.column(batch.schema.get_field_index("cycle_number")), pa.float64())
+    watermark = pc.take(wm_cycles, pc.index_in(platforms, value_set=wm_platforms))
+    keep = pc.fill_null(pc.or_kleene(pc.is_null(watermark), pc.greater(cycles, watermark)), False)
+    return batch.filter(keep)
+
+
+def remove_duplicates(conn, table: str) -> int:
+    """Deletes all but one row of each `dedup_key` group (the source parquet has a few repeated rows).
+
+    One sorted pass numbers the rows of each key group (NULL pressures group
+    together, like IS NOT DISTINCT FROM) and the first row in COPY order is kept.
+    """
+    # tableoid + ctid identifies a row physically, also across year partitions
+    key = ", ".join(dedup_key)
+    return conn.execute(text(
+        f"DELETE FROM {table} WHERE (tableoid, ctid) IN ("
+        f"  SELECT tableoid, ctid FROM ("
+        f"    SELECT tableoid, ctid, row_number() OVER (PARTITION BY {key} ORDER BY tableoid, ctid) AS rn"
+        f"    FROM {table}"
+        f"  ) numbered WHERE rn > 1"
+        f")"
+    )).rowcount
+
+
+def build_summary_tables(conn, measurement_table: str, suffix: str = "_staging"):
+    """Builds the summary tables from scratch as `<name><suffix>`."""
+    source = measurement_table
+    for table in summary_tables:
+        target = f"{table['name']}{suffix}"
+        conn.execute(text(f"DROP TABLE IF EXISTS {target}"))
+        conn.execute(text(f"CREATE TABLE {target} AS " + table["select"].format(source=source, where="")))
+        conn.execute(text(f"ALTER TABLE {target} ADD CONSTRAINT {target}_pkey PRIMARY KEY ({table['key']})"))
+        conn.execute(text(f"ANALYZE {target}"))
+        source = target
+
+
+def swap_summary_tables(conn, suffix: str = "_staging"):
+    for table in summary_tables:
+        name = table["name"]
+        conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        conn.execute(text(f"ALTER TABLE {name}{suffix} RENAME TO {name}"))
+        conn.execute(text(f"ALTER INDEX {name}{suffix}_pkey RENAME TO {name}_pkey"))
+
+
+def refresh_summary_tables(conn, changed_from: str) -> bool:
+    """Recomputes the summary rows of the floats that appear in `changed_from` (e.g. the incoming rows).
+
+    A database loaded before the summary tables existed gets them built in
+    full instead; returns True in that case.
+    """
+    missing = [t["name"] for t in summary_tables if not conn.dialect.has_table(conn, t["name"])]
+    if missing:
+        print(f"Summary tables {', '.join(missing)} not found. Building all summary tables from '{table_name}'...")
+        build_summary_tables(conn, table_name)
+        swap_summary_tables(conn)
+        return True
+
+    source = table_name
+    where = f"WHERE platform_number IN (SELECT DISTINCT platform_number FROM {changed_from})"
+    for table in summary_tables:
+        name = table["name"]
+        conn.execute(text(f"DELETE FROM {name} {where}"))
+        conn.execute(text(f"INSERT INTO {name} " + table["select"].format(source=source, where=where)))
+        source = name
+    return False
+
+
+def full_load(engine, parquet: pq.ParquetFile, partition_by_year: bool = False):
+    total_rows = parquet.metadata.num_rows
+    schema = output_schema(parquet)
+    partition_years = juld_years(parquet) if partition_by_year else None
+
+    print(f"Connecting to database '{db_name}' and loading data into staging table '{staging_table}'...")
+    start = time.perf_counter()
+    bytes_sent = 0
+
+    # One transaction: create + COPY + swap. Either the new table fully replaces the
+    # old one or nothing changes. (Creating and filling a table in the same transaction
+    # also lets PostgreSQL skip WAL for it when wal_level=minimal.)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging_table}"))
+        create_table(conn, staging_table, schema, partition_years)
+
+        cursor = conn.connection.cursor()
+        with tqdm(total=total_rows, unit="rows", unit_scale=True, desc="COPY") as progress:
+            for batch in iter_batches(parquet):
+                bytes_sent += copy_batch(cursor, staging_table, decode_batch(batch))
+                progress.update(batch.num_rows)
+
+        copy_seconds = time.perf_counter() - start
+        print(
+            f"Copied {total_rows} rows in {copy_seconds:.1f}s "
+            f"({total_rows / copy_seconds:,.0f} rows/s, {bytes_sent / copy_seconds / 1e6:.1f} MB/s)."
+        )
+
+        print("Building indexes and collecting planner statistics...")
+        index_start = time.perf_counter()
+        create_indexes(conn, staging_table)
+        duplicates = remove_duplicates(conn, staging_table)
+        if duplicates:
+            print(f"Removed {duplicates} duplicate rows ({', '.join(dedup_key)}).")
+        conn.execute(text(f"ANALYZE {staging_table}"))
+        print(f"Indexes and statistics ready in {time.perf_counter() - index_start:.1f}s.")
+
+        print("Building per-cycle and per-float summary tables...")
+        build_summary_tables(conn, staging_table)
+
+        # Precompute the schema/date-range/platform context for the API's prompt. This reads
+        # the staging tables, so the old tables stay queryable while it runs.
+        print("Precomputing the database context for the API...")
+        store_db_context(
+            conn, table_name, source_table=staging_table,
+            summary_tables=[{**t, "source": f"{t['name']}_staging"} for t in summary_tables],
+        )
+
+        rebuild_watermarks(conn, staging_table)
+
+        # Swap the staging table in, then bump the data version so the API drops
+        # caches built on the old data and reloads the context
+        conn.execute(text(f"DROP TABLE IF EXISTS {table_name}"))
+        conn.execute(text(f"ALTER TABLE {staging_table} RENAME TO {table_name}"))
+        rename_table_objects(conn, staging_table, table_name)
+        swap_summary_tables(conn)
+        mark_platforms_changed(conn, ALL_PLATFORMS)
+        data_version = bump_data_version(conn)
+
+    total_seconds = time.perf_counter() - start
+    print(f"SUCCESS: Data has been loaded into the PostgreSQL database in {total_seconds:.1f}s (data version {data_version}).")
+
+
+def incremental_load(engine, parquet: pq.ParquetFile):
+    schema = output_schema(parquet)
+    columns = ", ".join(f'"{f.name}"' for f in schema)
+    key = ", ".join(dedup_key)
+    start = time.perf_counter()
+    rows_read = rows_sent = 0
+
+    with engine.begin() as conn:
+        if not conn.dialect.has_table(conn, table_name) or not conn.dialect.has_table(conn, watermark_table):
+            print(f"No existing '{table_name}' (or watermarks) found. Run a full load first.")
+            return
+
+        wm_platforms, wm_cycles = load_watermarks(conn)
+        print(f"Loaded watermarks for {len(wm_platforms)} floats. Copying new cycles only...")
+
+        conn.execute(text(f"CREATE TEMP TABLE {incoming_table} (LIKE {table_name}) ON COMMIT DROP"))
+        cursor = conn.connection.cursor()
+        with tqdm(total=parquet.metadata.num_rows, unit="rows", unit_scale=True, desc="Scan") as progress:
+            for batch in iter_batches(parquet):
+                new_rows = new_cycles_only(decode_batch(batch), wm_platforms, wm_cycles)
+                if new_rows.num_rows:
+                    copy_batch(cursor, incoming_table, new_rows)
+                rows_read += batch.num_rows
+                rows_sent += new_rows.num_rows
+                progress.update(batch.num_rows)
+
+        # Deduplicate within the delivery and against what's already loaded
+        inserted = conn.execute(text(
+            f"INSERT INTO {table_name} ({columns}) "
+            f"SELECT DISTINCT ON ({key}) {columns} FROM {incoming_table} i "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table_name} a "
+            f"  WHERE a.platform_number = i.platform_number AND a.cycle_number = i.cycle_number "
+            f"  AND a.pressure IS NOT DISTINCT FROM i.pressure)"
+        )).rowcount
+
+        if inserted == 0:
+            print(f"No new cycles found ({rows_read} rows scanned in {time.perf_counter() - start:.1f}s).")
+            return
+
+        conn.execute(text(
+            f"INSERT INTO {watermark_table} (platform_number, max_cycle_number, updated_at) "
+            f"SELECT platform_number, MAX(cycle_number), CURRENT_TIMESTAMP FROM {incoming_table} GROUP BY platform_number "
+            f"ON CONFLICT (platform_number) DO UPDATE SET "
+            f"max_cycle_number = GREATEST({watermark_table}.max_cycle_number, excluded.max_cycle_number), "
+            f"updated_at = excluded.updated_at"
+        ))
+        summaries_rebuilt = refresh_summary_tables(conn, incoming_table)
+        conn.execute(text(f"ANALYZE {table_name}"))
+        changed = conn.execute(text(f"SELECT DISTINCT platform_number FROM {incoming_table}")).scalars().all()
+        mark_platforms_changed(conn, changed)
+
+        # Widen the stored date range from the new rows only, instead of rescanning the table
+        raw_context = conn.execute(text(f"SELECT value FROM {METADATA_TABLE} WHERE key = :key"), {"key": DB_CONTEXT_KEY}).scalar()
+        if raw_context and not summaries_rebuilt:
+            context = json.loads(raw_context)
+            incoming = compute_db_context(conn, table_name, source_table=incoming_table)
+            context["min_date"] = min(context["min_date"], incoming["min_date"])
+            context["max_date"] = max(context["max_date"], incoming["max_date"])
+            write_metadata(conn, DB_CONTEXT_KEY, json.dumps(context))
+        else:
+            # No stored context, or it predates the summary tables: compute it in full
+            store_db_context(conn, table_name, summary_tables=summary_tables)
+        data_version = bump_data_version(conn)
+
+    seconds = time.perf_counter() - start
+    print(
+        f"SUCCESS: Inserted {inserted} new rows for {len(changed)} floats "
+        f"({rows_sent} candidate rows out of {rows_read} scanned) in {seconds:.1f}s (data version {data_version})."
+    )
+    print("Run `python populate_vectordb.py --incremental` to refresh the summaries of the changed floats.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load ARGO parquet data into PostgreSQL.")
+    parser.add_argument("--incremental", action="store_true", help="Append only cycles newer than each float's watermark.")
+    parser.add_argument("--parquet", default=parquet_file, help="Parquet file to load.")
+    parser.add_argument("--partition-by-year", action="store_true",
+                        help="Range-partition the table by year of juld (full loads only).")
+    args = parser.parse_args()
+
+    parquet = pq.ParquetFile(args.parquet)
+    print(f"Streaming {parquet.metadata.num_rows} rows from {args.parquet} ({parquet.num_row_groups} row groups)...")
+
+    # Create the connection string for SQLAlchemy
+    engine_string = f"postgresql+psycopg2://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
+    engine = create_engine(engine_string)
+
+    if args.incremental:
+        incremental_load(engine, parquet)
+    else:
+        full_load(engine, parquet, partition_by_year=args.partition_by_year)
+
 
-print("SUCCESS: Data has been loaded into the PostgreSQL database.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,22 @@
 import pandas as pd
+import numpy as np
 from sqlalchemy import create_engine, text
 import chromadb
 from sentence_transformers import SentenceTransformer
 from dotenv import load_dotenv
+import argparse
+import json
 import os
+import time
 from tqdm import tqdm
-
-print("--- Starting Vector Database Population Process ---")
+from backend.retrieval import CYCLE_COLLECTION, FLOAT_COLLECTION
+from backend.metadata import (
+    ALL_PLATFORMS,
+    DATA_VERSION_KEY,
+    clear_changed_platforms,
+    read_changed_platforms,
+    read_metadata,
+)
 
 # --- 1. Load Configuration ---
 load_dotenv()
@@ -16,83 +26,308 @@ DB_HOST = 'localhost'
 DB_PORT = '5432'
 DB_NAME = 'argo_db'
 
-# --- 2. Connect to PostgreSQL ---
-print("Connecting to PostgreSQL to fetch float summary data...")
-try:
-    engine_string = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    engine = create_engine(engine_string)
-    
-    # Query to get a summary for each unique float
-    summary_query = """
-    SELECT 
-        platform_number,
-        COUNT(DISTINCT cycle_number) as total_cycles,
-        MIN(juld)::date as first_seen,
-        MAX(juld)::date as last_seen,
-        MIN(latitude) as min_lat,
-        MAX(latitude) as max_lat,
-        MIN(longitude) as min_lon,
-        MAX(longitude) as max_lon
-    FROM 
-        argo_data
-    GROUP BY 
+CHROMA_PATH = "chroma_db"
+# Progress is saved here after every chunk so an interrupted run can resume
+CHECKPOINT_FILE = os.path.join(CHROMA_PATH, "populate_checkpoint_{collection}.json")
+
+
+# --- 2. Document Generation (vectorized over a whole chunk) ---
+def fmt(values, spec: str = "%.2f") -> np.ndarray:
+    """Formats a numeric column in one call instead of row by row."""
+    return np.char.mod(spec, values.to_numpy(dtype=float))
+
+
+def date_ints(values) -> pd.Series:
+    """Dates as YYYYMMDD integers, since Chroma can only range-filter numbers."""
+    dates = pd.to_datetime(values)
+    return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).fillna(0).astype(int)
+
+
+def metadata_records(columns: dict) -> list:
+    """Turns a dict of equal-length columns into Chroma metadata dicts with plain Python values."""
+    frame = pd.DataFrame(columns)
+    records = frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+    # Chroma doesn't accept None values; leave missing fields out instead
+    return [{k: v for k, v in r.items() if v is not None} for r in records]
+
+
+def float_documents(df: pd.DataFrame):
+    """Builds the document text, metadata and IDs for a chunk of float summaries."""
+    platform = df['platform_number'].astype(str)
+    docs = (
+        "ARGO float with platform number " + platform
+        + " was active from " + df['first_seen'].astype(str) + " to " + df['last_seen'].astype(str) + ". "
+        + "It recorded " + df['total_cycles'].astype(str) + " cycles. "
+        + "Its operational area was between latitudes " + fmt(df['min_lat']) + " and " + fmt(df['max_lat'])
+        + ", and longitudes " + fmt(df['min_lon']) + " and " + fmt(df['max_lon']) + "."
+    )
+    # Store the platform number plus numeric ranges in the metadata so retrieval can pre-filter,
+    # and use the platform number as the unique ID
+    metadatas = metadata_records({
+        "platform_number": platform,
+        "first_seen": date_ints(df['first_seen']),
+        "last_seen": date_ints(df['last_seen']),
+        "min_lat": df['min_lat'].astype(float),
+        "max_lat": df['max_lat'].astype(float),
+        "min_lon": df['min_lon'].astype(float),
+        "max_lon": df['max_lon'].astype(float),
+    })
+    return docs.tolist(), metadatas, platform.tolist()
+
+
+def cycle_documents(df: pd.DataFrame):
+    """Builds one document per profile (float + cycle) with its date and position as metadata."""
+    platform = df['platform_number'].astype(str)
+    cycle = df['cycle_number'].astype(int).astype(str)
+    docs = (
+        "Profile " + cycle + " of ARGO float " + platform
+        + " was measured on " + pd.to_datetime(df['juld']).dt.date.astype(str)
+        + " at latitude " + fmt(df['latitude']) + ", longitude " + fmt(df['longitude'])
+        + ", down to " + fmt(df['max_pressure'], "%.0f") + " dbar. "
+        + "Surface temperature " + fmt(df['surface_temperature']) + " °C, surface salinity "
+        + fmt(df['surface_salinity']) + " PSU."
+    )
+    metadatas = metadata_records({
+        "platform_number": platform,
+        "cycle_number": df['cycle_number'].astype(int),
+        "date": date_ints(df['juld']),
+        "latitude": df['latitude'].astype(float),
+        "longitude": df['longitude'].astype(float),
+    })
+    return docs.tolist(), metadatas, (platform + "_" + cycle).tolist()
+
+
+# --- 3. Streaming Source ---
+def last_key(df: pd.DataFrame, keys: list) -> dict:
+    """The key of the last row in a chunk, as plain Python values."""
+    return {k: df[k].iloc[-1].item() if hasattr(df[k].iloc[-1], "item") else df[k].iloc[-1] for k in keys}
+
+
+def iter_chunks(engine, query: str, keys: list, params: dict, chunk_size: int, after: dict = None):
+    """Yields DataFrames of `chunk_size` rows, paging on `keys` (keyset pagination, so it can resume).
+
+    `query` must filter on `:after_<key>` parameters (NULL on the first page).
+    """
+    while True:
+        after_params = {f"after_{k}": (after or {}).get(k) for k in keys}
+        with engine.connect() as conn:
+            df = pd.read_sql(text(query), conn, params={**params, **after_params, "limit": chunk_size})
+        if df.empty:
+            return
+        yield df
+        after = last_key(df, keys)
+
+
+def platform_filter(platforms) -> tuple:
+    if platforms == ALL_PLATFORMS:
+        return "", {}
+    return "AND platform_number = ANY(:platforms)", {"platforms": list(platforms)}
+
+
+def float_summary_chunks(engine, platforms, chunk_size: int, after=None):
+    """Streams rows of argo_float_summary (optionally only the given platforms) in platform order."""
+    condition, params = platform_filter(platforms)
+    # The per-float summary is precomputed by load_to_sql.py, so this reads a small table
+    query = f"""
+    SELECT
+        platform_number, total_cycles, first_seen, last_seen,
+        min_lat, max_lat, min_lon, max_lon
+    FROM
+        argo_float_summary
+    WHERE (CAST(:after_platform_number AS TEXT) IS NULL OR platform_number > :after_platform_number)
+    {condition}
+    ORDER BY
         platform_number
+    LIMIT :limit;
+    """
+    return iter_chunks(engine, query, ["platform_number"], params, chunk_size, after)
+
+
+def cycle_summary_chunks(engine, platforms, chunk_size: int, after=None):
+    """Streams rows of argo_cycle_summary in (platform, cycle) order."""
+    condition, params = platform_filter(platforms)
+    query = f"""
+    SELECT
+        platform_number, cycle_number, juld, latitude, longitude,
+        max_pressure, surface_temperature, surface_salinity
+    FROM
+        argo_cycle_summary
+    WHERE (CAST(:after_platform_number AS TEXT) IS NULL
+           OR (platform_number, cycle_number) > (:after_platform_number, :after_cycle_number))
+    {condition}
     ORDER BY
-        platform_number;
+        platform_number, cycle_number
+    LIMIT :limit;
     """
-    floats_df = pd.read_sql(text(summary_query), engine.connect())
-    print(f"Successfully fetched summary data for {len(floats_df)} unique floats.")
-
-except Exception as e:
-    print(f"❌ ERROR: Could not connect to PostgreSQL. Please check your connection details. Error: {e}")
-    exit()
-
-# --- 3. Generate Text Summaries (Documents) ---
-print("Generating text summaries for each float...")
-documents = []
-metadatas = []
-ids = []
-
-for _, row in tqdm(floats_df.iterrows(), total=floats_df.shape[0], desc="Processing floats"):
-    # Create a simple, descriptive sentence for each float
-    doc = (
-        f"ARGO float with platform number {row['platform_number']} was active from {row['first_seen']} to {row['last_seen']}. "
-        f"It recorded {row['total_cycles']} cycles. "
-        f"Its operational area was between latitudes {row['min_lat']:.2f} and {row['max_lat']:.2f}, and longitudes {row['min_lon']:.2f} and {row['max_lon']:.2f}."
-    )
-    documents.append(doc)
-    # Store the platform number in the metadata for easy retrieval
-    metadatas.append({"platform_number": str(row['platform_number'])})
-    # Use the platform number as the unique ID for each entry
-    ids.append(str(row['platform_number']))
-
-# --- 4. Create Vector Embeddings ---
-# This will download a pre-trained model from Hugging Face the first time it's run
-print("Loading sentence-transformer model to create vector embeddings...")
-model = SentenceTransformer('all-MiniLM-L6-v2')
-embeddings = model.encode(documents, show_progress_bar=True)
-print("Embeddings created successfully.")
-
-# --- 5. Initialize ChromaDB and Populate the Collection ---
-print("Initializing ChromaDB client...")
-# This creates a persistent database in a folder named 'chroma_db'
-client = chromadb.PersistentClient(path="chroma_db") 
-
-# Create a new collection or get it if it already exists
-collection_name = "argo_float_summaries"
-print(f"Creating or getting ChromaDB collection: '{collection_name}'")
-collection = client.get_or_create_collection(name=collection_name)
-
-# Add the documents, embeddings, and metadata to the collection
-# This process might take a moment
-print("Adding data to the ChromaDB collection. This may take a few minutes...")
-collection.add(
-    embeddings=embeddings,
-    documents=documents,
-    metadatas=metadatas,
-    ids=ids
-)
+    return iter_chunks(engine, query, ["platform_number", "cycle_number"], params, chunk_size, after)
+
+
+# What each collection is built from: (chunk source, document builder, keyset columns)
+INDEXES = {
+    FLOAT_COLLECTION: (float_summary_chunks, float_documents, ["platform_number"]),
+    CYCLE_COLLECTION: (cycle_summary_chunks, cycle_documents, ["platform_number", "cycle_number"]),
+}
+
+
+# --- 4. Checkpoints ---
+def checkpoint_path(run_id: dict) -> str:
+    return CHECKPOINT_FILE.format(collection=run_id["collection"])
+
+
+def load_checkpoint(run_id: dict):
+    """Returns the last completed key if the saved checkpoint belongs to this same run."""
+    path = checkpoint_path(run_id)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    return checkpoint["last_key"] if checkpoint.get("run") == run_id else None
+
+
+def save_checkpoint(run_id: dict, key: dict):
+    with open(checkpoint_path(run_id), "w") as f:
+        json.dump({"run": run_id, "last_key": key}, f, default=str)
+
+
+def clear_checkpoint(run_id: dict):
+    if os.path.exists(checkpoint_path(run_id)):
+        os.remove(checkpoint_path(run_id))
+
+
+# --- 5. Encode + Upsert Pipeline ---
+class Encoder:
+    """Encodes in fixed-size batches, optionally with one worker process per CPU core."""
+
+    def __init__(self, model_name: str, batch_size: int, processes: int):
+        self.model = SentenceTransformer(model_name)
+        self.batch_size = batch_size
+        self.pool = None
+        if processes > 1:
+            self.pool = self.model.start_multi_process_pool(target_devices=["cpu"] * processes)
+
+    def encode(self, documents):
+        if self.pool is not None:
+            return self.model.encode_multi_process(documents, self.pool, batch_size=self.batch_size)
+        return self.model.encode(documents, batch_size=self.batch_size)
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+
+
+def populate(collection, chunks, build_documents, encoder: Encoder, upsert_batch: int, keys: list, run_id: dict):
+    """Streams chunks through document generation, encoding and chunked upserts.
+
+    Only one chunk of documents and embeddings is held in memory at a time.
+    Returns (documents written, seconds).
+    """
+    written = 0
+    start = time.perf_counter()
+    with tqdm(unit="docs", desc=f"Indexing {collection.name}") as progress:
+        for df in chunks:
+            documents, metadatas, ids = build_documents(df)
+            embeddings = encoder.encode(documents)
+            # upsert, not add: re-runs and changed floats replace their old entries
+            for i in range(0, len(ids), upsert_batch):
+                collection.upsert(
+                    embeddings=embeddings[i:i + upsert_batch],
+                    documents=documents[i:i + upsert_batch],
+                    metadatas=metadatas[i:i + upsert_batch],
+                    ids=ids[i:i + upsert_batch],
+                )
+            save_checkpoint(run_id, last_key(df, keys))
+            written += len(ids)
+            progress.update(len(ids))
+            progress.set_postfix(docs_per_sec=f"{written / (time.perf_counter() - start):,.0f}")
+    return written, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the ChromaDB float and profile summaries from PostgreSQL.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only refresh floats that load_to_sql.py marked as changed.")
+    parser.add_argument("--collections", nargs="+", choices=list(INDEXES), default=list(INDEXES),
+                        help="Which collections to build (default: all).")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Rows fetched and indexed per chunk.")
+    parser.add_argument("--encode-batch", type=int, default=128, help="Sentence-transformer batch size.")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Encode with this many worker processes (e.g. the number of CPU cores).")
+    parser.add_argument("--restart", action="store_true", help="Ignore any saved checkpoint.")
+    # HNSW build parameters; only applied when a collection is created
+    parser.add_argument("--hnsw-m", type=int, help="HNSW graph degree (hnsw:M).")
+    parser.add_argument("--hnsw-construction-ef", type=int, help="HNSW build-time candidate list (hnsw:construction_ef).")
+    # Query-time tuning; also updated on existing collections
+    parser.add_argument("--hnsw-search-ef", type=int, help="HNSW query-time candidate list (hnsw:search_ef).")
+    args = parser.parse_args()
+
+    print("--- Starting Vector Database Population Process ---")
+
+    # --- Connect to PostgreSQL ---
+    print("Connecting to PostgreSQL to fetch summary data...")
+    try:
+        engine_string = f"postgresql+psycopg2://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+        engine = create_engine(engine_string)
+        # Read before the changed floats, so a load that lands in between keeps them pending
+        data_version = read_metadata(engine, DATA_VERSION_KEY, default="0")
+        # In incremental mode, only summarize the floats that received new cycles
+        changed_platforms = read_changed_platforms(engine) if args.incremental else ALL_PLATFORMS
+    except Exception as e:
+        print(f"❌ ERROR: Could not connect to PostgreSQL. Please check your connection details. Error: {e}")
+        exit()
+
+    if not changed_platforms:
+        print("No floats changed since the last run. Nothing to do.")
+        return
+
+    # --- Initialize ChromaDB ---
+    print("Initializing ChromaDB client...")
+    # This creates a persistent database in a folder named 'chroma_db'
+    client = chromadb.PersistentClient(path=CHROMA_PATH)
+    upsert_batch = min(args.chunk_size, client.get_max_batch_size())
+    hnsw = {
+        key: value for key, value in {
+            "hnsw:M": args.hnsw_m,
+            "hnsw:construction_ef": args.hnsw_construction_ef,
+            "hnsw:search_ef": args.hnsw_search_ef,
+        }.items() if value is not None
+    }
+
+    # This will download a pre-trained model from Hugging Face the first time it's run
+    print("Loading sentence-transformer model to create vector embeddings...")
+    encoder = Encoder('all-MiniLM-L6-v2', args.encode_batch, args.processes)
+    try:
+        for name in args.collections:
+            chunk_source, build_documents, keys = INDEXES[name]
+            print(f"Creating or getting ChromaDB collection: '{name}'")
+            collection = client.get_or_create_collection(name=name, metadata=hnsw or None)
+            metadata = collection.metadata or {}
+            if args.hnsw_search_ef is not None and metadata.get("hnsw:search_ef") != args.hnsw_search_ef:
+                collection.modify(metadata={**metadata, "hnsw:search_ef": args.hnsw_search_ef})
+                print(f"Set hnsw:search_ef={args.hnsw_search_ef} on '{name}'.")
+
+            # A checkpoint is only valid for the same data version and the same set of floats
+            run_id = {"collection": name, "data_version": data_version, "platforms": changed_platforms}
+            resume_after = None if args.restart else load_checkpoint(run_id)
+            if resume_after is not None:
+                print(f"Resuming '{name}' after {resume_after} from the last checkpoint.")
+
+            chunks = chunk_source(engine, changed_platforms, args.chunk_size, after=resume_after)
+            written, seconds = populate(collection, chunks, build_documents, encoder, upsert_batch, keys, run_id)
+            clear_checkpoint(run_id)
+            print(f"Indexed {written} documents into '{name}' in {seconds:.1f}s "
+                  f"({written / max(seconds, 1e-9):,.0f} docs/sec); it now contains {collection.count()} entries.")
+    finally:
+        encoder.close()
+
+    # The floats this run read are now reflected in the vector DB, but only once every collection has them
+    if set(args.collections) == set(INDEXES):
+        with engine.begin() as conn:
+            clear_changed_platforms(conn, changed_platforms, data_version)
+    else:
+        print("⚠️ Not every collection was refreshed; changed floats stay pending for the next full run.")
+
+    print("\n--- ✅ Vector Database Population Complete! ---")
+
 
-print("\n--- ✅ Vector Database Population Complete! ---")
-print(f"A new folder named 'chroma_db' has been created in your project directory.")
-print(f"The collection '{collection_name}' now contains {collection.count()} entries.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()